@@ -0,0 +1,165 @@
+"""
+Secondary indexes over audit records for search by drug, risk and time range
+Persisted in SQLite (inverted drug -> record index plus a time index) and updated on every append
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .audit_store import AuditStore
+from .blockchain_audit import audit_log
+from .config import AUDIT_INDEX_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS records (
+    block_index INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    global_risk REAL,
+    interaction_count INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (block_index, position)
+);
+CREATE INDEX IF NOT EXISTS records_by_time ON records (timestamp);
+CREATE INDEX IF NOT EXISTS records_by_risk ON records (global_risk, timestamp);
+CREATE TABLE IF NOT EXISTS record_drugs (
+    drug TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    block_index INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (drug, block_index, position)
+);
+CREATE INDEX IF NOT EXISTS record_drugs_by_time ON record_drugs (drug, timestamp);
+"""
+
+
+def _iter_records(block_data: Dict[str, Any]) -> Iterable[Tuple[int, float, Dict[str, Any]]]:
+    """(position, timestamp, data) for every interaction-check record in a block."""
+    records = block_data.get("records")
+    if records is None:
+        records = [{"timestamp": block_data["timestamp"], "data": block_data["data"]}]
+    for position, entry in enumerate(records):
+        if isinstance(entry.get("data"), dict) and "drugs" in entry["data"]:
+            yield position, entry["timestamp"], entry["data"]
+
+
+class AuditIndex:
+    def __init__(self, store: AuditStore, path: Path = AUDIT_INDEX_PATH):
+        self.store = store
+        # Every uvicorn worker shares the database; WAL lets them read while one writes
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # The log is the source of truth; the index can be rebuilt
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def indexed_blocks(self) -> int:
+        """Number of leading blocks whose records are all indexed."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'indexed_blocks'").fetchone()
+        return row[0] if row else 0
+
+    def add_blocks(self, blocks: List[Dict[str, Any]]):
+        """Indexes freshly appended blocks. Called by the chain after every append."""
+        if not blocks:
+            return
+        with self._lock, self.conn:
+            self._insert(blocks)
+            if blocks[0]["index"] == self.indexed_blocks():
+                self._set_indexed(blocks[-1]["index"] + 1)
+
+    def catch_up(self, batch_size: int = 1000) -> int:
+        """Indexes blocks appended while nobody was listening (first start, other processes, crashes)."""
+        total = 0
+        while True:
+            with self._lock, self.conn:
+                start = self.indexed_blocks()
+                stop = min(len(self.store), start + batch_size)
+                if start >= stop:
+                    return total
+                self._insert(self.store.iter_blocks(range(start, stop)))
+                self._set_indexed(stop)
+            total += stop - start
+
+    def _insert(self, blocks: Iterable[Dict[str, Any]]):
+        record_rows, drug_rows = [], []
+        for block_data in blocks:
+            block_index = block_data["index"]
+            for position, timestamp, data in _iter_records(block_data):
+                record_rows.append((
+                    block_index, position, timestamp, data.get("global_risk"),
+                    data.get("interaction_count"), json.dumps(data)
+                ))
+                for drug in {str(d).strip().lower() for d in data.get("drugs") or []}:
+                    drug_rows.append((drug, timestamp, block_index, position))
+        self.conn.executemany("INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?, ?, ?)", record_rows)
+        self.conn.executemany("INSERT OR IGNORE INTO record_drugs VALUES (?, ?, ?, ?)", drug_rows)
+
+    def _set_indexed(self, value: int):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('indexed_blocks', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)", (value,)
+        )
+
+    def search(self, drugs: Optional[List[str]] = None, min_risk: Optional[float] = None,
+               since: Optional[float] = None, until: Optional[float] = None,
+               limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Newest-first records matching every filter. All listed drugs must appear in a record;
+        global risk is strictly above min_risk and timestamps fall in since <= t < until.
+        `cursor` is the next_cursor of the previous page.
+        """
+        drugs = sorted({d.strip().lower() for d in drugs or [] if d.strip()})
+        clauses, params = [], []
+        if drugs:
+            # Walk the posting list of the first drug; the rest are point lookups on the primary key
+            first, others = drugs[0], drugs[1:]
+            sql = ("SELECT r.block_index, r.position, r.timestamp, r.data FROM record_drugs d "
+                   "JOIN records r ON r.block_index = d.block_index AND r.position = d.position")
+            clauses.append("d.drug = ?")
+            params.append(first)
+            for drug in others:
+                clauses.append("EXISTS (SELECT 1 FROM record_drugs o WHERE o.drug = ? "
+                               "AND o.block_index = r.block_index AND o.position = r.position)")
+                params.append(drug)
+            time_column = "d.timestamp"
+        else:
+            sql = "SELECT r.block_index, r.position, r.timestamp, r.data FROM records r"
+            time_column = "r.timestamp"
+        if since is not None:
+            clauses.append(f"{time_column} >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"{time_column} < ?")
+            params.append(until)
+        if min_risk is not None:
+            clauses.append("r.global_risk > ?")
+            params.append(min_risk)
+        if cursor:
+            timestamp, block_index, position = cursor.split(":")
+            clauses.append(f"({time_column}, r.block_index, r.position) < (?, ?, ?)")
+            params.extend([float(timestamp), int(block_index), int(position)])
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {time_column} DESC, r.block_index DESC, r.position DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+            indexed = self.indexed_blocks()
+        page = rows[:limit]
+        results = [
+            {"block_index": block_index, "position": position, "timestamp": timestamp, "data": json.loads(data)}
+            for block_index, position, timestamp, data in page
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1]
+            next_cursor = f"{last[2]!r}:{last[0]}:{last[1]}"
+        return {"results": results, "next_cursor": next_cursor, "indexed_blocks": indexed}
+
+# Singleton instance - kept current by the chain's append hook
+audit_index = AuditIndex(audit_log.store)
+audit_log.on_append.append(audit_index.add_blocks)
@@ -0,0 +1,351 @@
+"""
+Segmented append-only storage for the audit chain
+Blocks are JSON lines in size-capped segment files. Each segment has a compact binary
+index (offset + block header per entry), so opening the log maps the indexes instead of
+parsing history, and block bodies are read on demand through memory-mapped segments.
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .config import AUDIT_DIR, AUDIT_SEGMENT_BYTES, AUDIT_LOCK_PATH, AUDIT_CHAIN_PATH, LEGACY_AUDIT_CHAIN_PATH
+from .file_lock import lock_file, unlock_file
+
+# Fields covered by a block hash - the stored hash itself is never part of the input
+HASHED_FIELDS = ("index", "timestamp", "data", "previous_hash")
+
+# Index entry: body offset, body length, timestamp, hash, previous_hash (84 bytes)
+INDEX_ENTRY = struct.Struct("<QId32s32s")
+ZERO_HASH = bytes(32)  # Genesis previous_hash "0"
+
+BlockHeader = namedtuple("BlockHeader", ["index", "timestamp", "hash", "previous_hash"])
+
+
+def canonical_block_hash(block_data: Dict[str, Any]) -> str:
+    payload = {field: block_data[field] for field in HASHED_FIELDS}
+    block_string = json.dumps(payload, sort_keys=True).encode()
+    return hashlib.sha256(block_string).hexdigest()
+
+
+def _pack_hash(value: str) -> bytes:
+    return ZERO_HASH if value == "0" else bytes.fromhex(value)
+
+
+def _unpack_hash(raw: bytes) -> str:
+    return "0" if raw == ZERO_HASH else raw.hex()
+
+
+def _pack_entry(offset: int, length: int, block_data: Dict[str, Any]) -> bytes:
+    return INDEX_ENTRY.pack(
+        offset, length, block_data['timestamp'],
+        _pack_hash(block_data['hash']), _pack_hash(block_data['previous_hash'])
+    )
+
+
+def _encode_block(block_data: Dict[str, Any]) -> bytes:
+    return json.dumps(block_data, separators=(',', ':')).encode() + b'\n'
+
+
+def _map_file(path: Path) -> Optional[mmap.mmap]:
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class Segment:
+    """One data file plus its offset index, named after the index of its first block."""
+
+    def __init__(self, directory: Path, first_index: int):
+        self.first_index = first_index
+        self.data_path = directory / f"{first_index:020d}.jsonl"
+        self.index_path = directory / f"{first_index:020d}.idx"
+        self.count = 0
+        self.data_size = 0
+        self._data_map = None
+        self._index_map = None
+        self._mapped_count = 0
+
+    def open(self, repair: bool):
+        self.data_size = self.data_path.stat().st_size if self.data_path.exists() else 0
+        index_size = self.index_path.stat().st_size if self.index_path.exists() else 0
+        self.count = index_size // INDEX_ENTRY.size
+        # Entries whose body never reached the disk are ignored (and cut off when repairing)
+        while self.count and self._entry_end(self.count - 1) > self.data_size:
+            self.count -= 1
+        if repair:
+            if index_size != self.count * INDEX_ENTRY.size:
+                with open(self.index_path, 'r+b') as f:
+                    f.truncate(self.count * INDEX_ENTRY.size)
+            self._reindex_tail()
+        self._remap()
+
+    def _entry_end(self, position: int) -> int:
+        with open(self.index_path, 'rb') as f:
+            f.seek(position * INDEX_ENTRY.size)
+            offset, length = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))[:2]
+        return offset + length
+
+    def _reindex_tail(self):
+        """Indexes bodies that were written without their index entries; drops a torn final line."""
+        offset = self._entry_end(self.count - 1) if self.count else 0
+        if offset == self.data_size:
+            return
+        entries = []
+        with open(self.data_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("torn write")
+                    entries.append(_pack_entry(offset, len(line), json.loads(line)))
+                except (ValueError, KeyError):
+                    break
+                offset += len(line)
+        if offset < self.data_size:
+            print(f"⚠ Truncating torn audit record in {self.data_path.name} at byte {offset}")
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(offset)
+            self.data_size = offset
+        if entries:
+            with open(self.index_path, 'ab') as f:
+                f.write(b''.join(entries))
+            self.count += len(entries)
+            print(f"✓ Re-indexed {len(entries)} audit blocks in {self.data_path.name}")
+
+    def _remap(self):
+        # Old maps are left to the garbage collector - a concurrent reader may still hold one
+        self._data_map = _map_file(self.data_path)
+        self._index_map = _map_file(self.index_path)
+        self._mapped_count = self.count if self._index_map is not None else 0
+
+    def _entry(self, position: int) -> Tuple:
+        if position >= self._mapped_count:
+            self._remap()  # The tail segment grew since it was mapped
+        return INDEX_ENTRY.unpack_from(self._index_map, position * INDEX_ENTRY.size)
+
+    def header(self, position: int) -> BlockHeader:
+        _, _, timestamp, block_hash, previous_hash = self._entry(position)
+        return BlockHeader(self.first_index + position, timestamp, _unpack_hash(block_hash), _unpack_hash(previous_hash))
+
+    def read(self, position: int) -> Dict[str, Any]:
+        offset, length = self._entry(position)[:2]
+        data_map = self._data_map
+        if data_map is None or offset + length > len(data_map):
+            self._remap()
+            data_map = self._data_map
+        return json.loads(data_map[offset:offset + length])
+
+    def append(self, encoded: Sequence[Tuple[Dict[str, Any], bytes]], fsync: bool):
+        entries = []
+        offset = self.data_size
+        for block_data, line in encoded:
+            entries.append(_pack_entry(offset, len(line), block_data))
+            offset += len(line)
+        # Bodies first, then index entries - recovery re-indexes bodies that lost their entries
+        payloads = ((self.data_path, b''.join(line for _, line in encoded)), (self.index_path, b''.join(entries)))
+        for path, payload in payloads:
+            with open(path, 'ab') as f:
+                f.write(payload)
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+        self.data_size = offset
+        self.count += len(encoded)
+
+
+class AuditStore:
+    """
+    Every uvicorn worker opens the same segments. Appends happen under an exclusive
+    file lock and re-read the tail first, so all processes extend one linear chain.
+    """
+
+    def __init__(self, directory: Path = AUDIT_DIR, segment_bytes: int = AUDIT_SEGMENT_BYTES,
+                 readonly: bool = False, lock_path: Path = AUDIT_LOCK_PATH,
+                 legacy_paths: Sequence[Path] = (AUDIT_CHAIN_PATH, LEGACY_AUDIT_CHAIN_PATH)):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.lock_path = Path(lock_path)
+        self.segments: List[Segment] = []
+        self._thread_lock = threading.Lock()
+        if readonly:
+            self.open(repair=False)
+            return
+        with self.lock():
+            self.migrate_legacy(legacy_paths)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.open(repair=True)
+
+    @contextmanager
+    def lock(self):
+        """Exclusive across threads and processes. Hold it for any write to the log."""
+        with self._thread_lock, open(self.lock_path, 'a+b') as f:
+            lock_file(f)
+            try:
+                yield
+            finally:
+                unlock_file(f)
+
+    def open(self, repair: bool = True):
+        """Maps every segment index. Only the tail segment can need repair after a crash."""
+        segments = []
+        if self.directory.exists():
+            first_indices = sorted(int(path.stem) for path in self.directory.glob("*.jsonl"))
+            for i, first_index in enumerate(first_indices):
+                segment = Segment(self.directory, first_index)
+                segment.open(repair=repair and i == len(first_indices) - 1)
+                segments.append(segment)
+        self.segments = segments
+
+    def refresh(self, repair: bool = False):
+        """
+        Picks up blocks other processes appended since we last looked.
+        With repair=True (only under the lock) a tail left behind by a crashed writer is fixed up.
+        """
+        if not self.segments:
+            self.open(repair=repair)
+            return
+        tail = self.segments[-1]
+        tail.open(repair=False)
+        while (self.directory / f"{len(self):020d}.jsonl").exists():
+            tail = Segment(self.directory, len(self))
+            tail.open(repair=False)
+            self.segments.append(tail)
+        if repair:
+            tail.open(repair=True)
+
+    def __len__(self) -> int:
+        if not self.segments:
+            return 0
+        tail = self.segments[-1]
+        return tail.first_index + tail.count
+
+    def _locate(self, index: int) -> Tuple[Segment, int]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Block {index} does not exist")
+        lo, hi = 0, len(self.segments) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.segments[mid].first_index <= index:
+                lo = mid
+            else:
+                hi = mid - 1
+        segment = self.segments[lo]
+        return segment, index - segment.first_index
+
+    def header(self, index: int) -> BlockHeader:
+        segment, position = self._locate(index)
+        return segment.header(position)
+
+    def read_block(self, index: int) -> Dict[str, Any]:
+        segment, position = self._locate(index)
+        return segment.read(position)
+
+    def iter_blocks(self, indices: Iterable[int]) -> Iterator[Dict[str, Any]]:
+        for index in indices:
+            yield self.read_block(index)
+
+    def find_index(self, timestamp: float) -> int:
+        """
+        Position of the first block stamped at/after `timestamp`.
+        Binary search over index headers - no block bodies are read.
+        """
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.header(mid).timestamp < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def append(self, blocks: List[Dict[str, Any]], fsync: bool = False):
+        """
+        Appends blocks to the tail segment, rotating to a new segment once it is full.
+        Callers hold lock() and refresh(repair=True) first so the blocks extend the real tip.
+        """
+        if not blocks:
+            return
+        if blocks[0]['index'] != len(self):
+            raise ValueError(f"Block {blocks[0]['index']} does not extend a log of {len(self)} blocks")
+        tail = self.segments[-1] if self.segments else self._new_segment(blocks[0]['index'])
+        pending: List[Tuple[Dict[str, Any], bytes]] = []
+        pending_size = 0
+        for block_data in blocks:
+            line = _encode_block(block_data)
+            if (tail.count or pending) and tail.data_size + pending_size + len(line) > self.segment_bytes:
+                if pending:
+                    tail.append(pending, fsync=True)  # A sealed segment is always durable
+                tail = self._new_segment(block_data['index'])
+                pending, pending_size = [], 0
+            pending.append((block_data, line))
+            pending_size += len(line)
+        tail.append(pending, fsync=fsync)
+
+    def _new_segment(self, first_index: int) -> Segment:
+        segment = Segment(self.directory, first_index)
+        self.segments.append(segment)
+        return segment
+
+    def migrate_legacy(self, legacy_paths: Sequence[Path]):
+        """
+        One-time import of a single-file log (audit_chain.jsonl, or the older audit_chain.json array).
+        Segments are built in a staging directory and moved into place only when complete.
+        The legacy file is left untouched (audit_chain.json is tracked in git); once segments
+        exist it is never read again.
+        """
+        if self.directory.exists() and any(self.directory.glob("*.jsonl")):
+            return
+        legacy_path = next((path for path in legacy_paths if path.exists()), None)
+        if legacy_path is None:
+            return
+        staging_dir = self.directory.with_name(self.directory.name + ".migrating")
+        staging_lock = staging_dir.with_name(staging_dir.name + ".lock")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        try:
+            staging = AuditStore(staging_dir, self.segment_bytes, lock_path=staging_lock, legacy_paths=())
+            batch = []
+            for block_data in self._read_legacy(legacy_path):
+                batch.append(block_data)
+                if len(batch) >= 10000:
+                    staging.append(batch)
+                    batch = []
+            staging.append(batch)
+            for segment in staging.segments:
+                for path in (segment.data_path, segment.index_path):
+                    with open(path, 'rb+') as f:
+                        os.fsync(f.fileno())
+            migrated = len(staging)
+            del staging
+        except (ValueError, KeyError, OSError) as e:
+            print(f"⚠ Could not migrate legacy audit chain {legacy_path.name}: {e}")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            staging_lock.unlink(missing_ok=True)
+            return
+        if self.directory.exists():
+            self.directory.rmdir()  # Empty - checked above
+        staging_dir.rename(self.directory)
+        staging_lock.unlink(missing_ok=True)
+        print(f"✓ Migrated {migrated} audit blocks from {legacy_path.name} to {self.directory.name}/")
+
+    @staticmethod
+    def _read_legacy(path: Path) -> Iterator[Dict[str, Any]]:
+        if path.suffix == '.json':
+            with open(path, 'r') as f:
+                yield from json.load(f)
+            return
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Torn final write
+                yield json.loads(line)
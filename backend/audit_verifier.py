@@ -0,0 +1,191 @@
+"""
+Audit chain verification engine
+Incremental runs verify only blocks appended since the last checkpoint;
+full audits split the log across a process pool and report the first tampered block
+"""
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .audit_store import AuditStore, canonical_block_hash
+from .merkle import leaf_hash, merkle_root
+from .config import AUDIT_CHECKPOINT_PATH, AUDIT_VERIFY_WORKERS, AUDIT_VERIFY_PARALLEL_MIN_BLOCKS
+
+
+def _verify_range(directory: str, start: int, stop: int) -> Dict[str, Any]:
+    """
+    Verifies hashes and internal links of blocks [start, stop).
+    Runs in a worker process with its own read-only view of the segments,
+    so it only returns a small summary for stitching.
+    """
+    store = AuditStore(Path(directory), readonly=True)
+    summary = {
+        "count": 0, "first_index": start, "first_hash": None, "first_previous_hash": None,
+        "last_index": None, "last_hash": None, "bad_index": None, "reason": None
+    }
+    for index in range(start, stop):
+        try:
+            header = store.header(index)
+            block_data = store.read_block(index)
+            if block_data["index"] != index:
+                reason = "Block stored out of order"
+            elif canonical_block_hash(block_data) != block_data["hash"]:
+                reason = "Hash mismatch"
+            elif (header.hash, header.previous_hash) != (block_data["hash"], block_data["previous_hash"]):
+                reason = "Index entry does not match block"
+            elif summary["count"] and block_data["previous_hash"] != summary["last_hash"]:
+                reason = "Broken link to previous block"
+            else:
+                reason = None
+            records = block_data.get("records")
+            if reason is None and records is not None and (
+                    len(records) != block_data["data"].get("record_count")
+                    or merkle_root([leaf_hash(entry) for entry in records]) != block_data["data"].get("merkle_root")):
+                reason = "Merkle root mismatch"
+        except (ValueError, KeyError, TypeError, AttributeError):
+            reason = "Malformed block"
+        if reason is not None:
+            summary.update(bad_index=index, reason=reason)
+            return summary
+        if summary["count"] == 0:
+            summary["first_hash"] = block_data["hash"]
+            summary["first_previous_hash"] = block_data["previous_hash"]
+        summary["count"] += 1
+        summary["last_index"] = index
+        summary["last_hash"] = block_data["hash"]
+    return summary
+
+
+class AuditVerifier:
+    def __init__(self, store: AuditStore, checkpoint_path: Path = AUDIT_CHECKPOINT_PATH,
+                 workers: int = AUDIT_VERIFY_WORKERS):
+        self.store = store
+        self.checkpoint_path = Path(checkpoint_path)
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()  # One verification run (and checkpoint write) at a time
+
+    def load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """Returns the most recent checkpoint, or None if the log was never verified."""
+        if not self.checkpoint_path.exists():
+            return None
+        checkpoint = None
+        with open(self.checkpoint_path, 'rb') as f:
+            for line in f:
+                if line.endswith(b'\n'):
+                    checkpoint = json.loads(line)
+        return checkpoint
+
+    def save_checkpoint(self, index: int, block_hash: str, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Each checkpoint hash folds in the previous one, so the history itself is tamper-evident
+        previous_checkpoint_hash = previous["checkpoint_hash"] if previous else "0"
+        checkpoint_string = f"{previous_checkpoint_hash}:{index}:{block_hash}".encode()
+        checkpoint = {
+            "index": index,
+            "hash": block_hash,
+            "verified_at": time.time(),
+            "previous_checkpoint_hash": previous_checkpoint_hash,
+            "checkpoint_hash": hashlib.sha256(checkpoint_string).hexdigest()
+        }
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(checkpoint) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return checkpoint
+
+    def verify(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Verifies the chain. Incremental by default: re-checks the checkpointed block
+        and everything after it. With full=True every block is rehashed from genesis.
+        """
+        with self._lock:
+            return self._verify(full)
+
+    def _verify(self, full: bool) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self.store.open(repair=False)
+        stop = len(self.store)  # Snapshot - blocks appended meanwhile wait for the next run
+        latest = self.load_checkpoint()
+        checkpoint = None if full else latest
+        start = checkpoint["index"] if checkpoint else 0
+
+        if checkpoint and start >= stop:
+            summaries = []  # Log shrank below the checkpoint
+        else:
+            parts = self.workers if stop - start >= AUDIT_VERIFY_PARALLEL_MIN_BLOCKS else 1
+            bounds = [start + (stop - start) * k // parts for k in range(parts + 1)]
+            ranges = [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+            directory = str(self.store.directory)
+            if len(ranges) > 1:
+                # Spawn, not fork: the server forks from a process with live threads (audit writer, trainer)
+                with ProcessPoolExecutor(max_workers=len(ranges), mp_context=mp.get_context("spawn")) as pool:
+                    futures = [pool.submit(_verify_range, directory, a, b) for a, b in ranges]
+                    summaries = [future.result() for future in futures]
+            else:
+                summaries = [_verify_range(directory, a, b) for a, b in ranges]
+
+        result = self._stitch(summaries, checkpoint)
+        result.update(
+            mode="incremental" if checkpoint else "full",
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 2)
+        )
+        if result["valid"] and result["verified_up_to"] is not None:
+            tail = next(s for s in reversed(summaries) if s["count"])
+            with self.store.lock():  # Other workers may be checkpointing too
+                latest = self.load_checkpoint()
+                if not latest or tail["last_index"] > latest["index"]:
+                    latest = self.save_checkpoint(tail["last_index"], tail["last_hash"], latest)
+        result["checkpoint"] = latest
+        return result
+
+    def _stitch(self, summaries: List[Dict[str, Any]], checkpoint: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Checks the links between ranges and picks the first failure in chain order."""
+        checked = 0
+        previous = None
+        for summary in summaries:
+            failure = None
+            if summary["count"]:
+                if previous is None:
+                    failure = self._check_start(summary, checkpoint)
+                elif summary["first_previous_hash"] != previous["last_hash"]:
+                    failure = (summary["first_index"], "Broken link to previous block")
+            if failure is None and summary["reason"] is not None:
+                if summary["count"]:
+                    checked += summary["count"]  # Blocks before the bad one in this range were fine
+                    previous = summary
+                failure = (summary["bad_index"], summary["reason"])
+            if failure is not None:
+                return {
+                    "valid": False, "first_invalid_index": failure[0], "reason": failure[1],
+                    "blocks_checked": checked, "verified_up_to": previous["last_index"] if previous else None
+                }
+            checked += summary["count"]
+            previous = summary
+        if checkpoint and previous is None:
+            return {
+                "valid": False, "first_invalid_index": checkpoint["index"], "reason": "Checkpointed block is missing",
+                "blocks_checked": 0, "verified_up_to": None
+            }
+        return {
+            "valid": True, "first_invalid_index": None, "reason": None,
+            "blocks_checked": checked, "verified_up_to": previous["last_index"] if previous else None
+        }
+
+    @staticmethod
+    def _check_start(summary: Dict[str, Any], checkpoint: Optional[Dict[str, Any]]):
+        if checkpoint is None:
+            if summary["first_previous_hash"] != "0":
+                return summary["first_index"], "Chain does not start at genesis"
+            return None
+        # The checkpointed block is re-read first and must still be the block we signed off on
+        if summary["first_hash"] != checkpoint["hash"]:
+            return checkpoint["index"], "Checkpointed block was modified"
+        return None
+
+# Singleton instance - a read-only view; worker processes importing this module never touch the log
+audit_verifier = AuditVerifier(AuditStore(readonly=True))
@@ -0,0 +1,123 @@
+"""
+Background group-commit writer for the audit chain
+Requests enqueue records; one task packs each batch into a Merkle block and writes it with a single fsync
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .blockchain_audit import Blockchain, audit_log
+from .config import AUDIT_FLUSH_INTERVAL, AUDIT_MAX_BATCH, AUDIT_DURABILITY
+
+DURABILITY_MODES = ("batch", "none")
+
+
+def _consume_exception(future: asyncio.Future):
+    # Failures are logged by the writer; fire-and-forget callers never read them
+    if not future.cancelled():
+        future.exception()
+
+
+class AuditWriter:
+    def __init__(self, blockchain: Blockchain, flush_interval: float = AUDIT_FLUSH_INTERVAL,
+                 max_batch: int = AUDIT_MAX_BATCH, durability: str = AUDIT_DURABILITY):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown audit durability mode: {durability}")
+        self.blockchain = blockchain
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.durability = durability
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.stats = {"records": 0, "batches": 0, "fsyncs": 0, "errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes everything already queued, then stops the background task."""
+        if not self.running:
+            return
+        self._closing = True
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    def submit(self, data: Dict[str, Any]) -> asyncio.Future:
+        """
+        Queues a record without touching the disk.
+        Returns a future that resolves to the record's receipt (block index, block hash,
+        position and leaf hash) once the batch is written (and fsynced in "batch" mode).
+        Await it only when the receipt is needed.
+        """
+        loop = asyncio.get_running_loop()
+        if not self.running:
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        future = loop.create_future()
+        future.add_done_callback(_consume_exception)
+        self._queue.put_nowait((time.time(), data, future))
+        return future
+
+    async def append(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Queues a record and waits until it is durable."""
+        return await self.submit(data)
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            batch: List[Tuple[float, Dict[str, Any], asyncio.Future]] = []
+            stop = item is None
+            if not stop:
+                batch.append(item)
+                # Let concurrent requests pile up behind the first record
+                if self.flush_interval > 0 and not self._closing:
+                    await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                await self._flush(batch)
+            if (stop or self._closing) and self._queue.empty():
+                return
+
+    async def _flush(self, batch: List[Tuple[float, Dict[str, Any], asyncio.Future]]):
+        records = [(timestamp, data) for timestamp, data, _ in batch]
+        fsync = self.durability == "batch"
+        loop = asyncio.get_running_loop()
+        try:
+            # File I/O runs in a worker thread so the event loop keeps serving requests
+            receipts = await loop.run_in_executor(None, self.blockchain.add_record_batch, records, fsync)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"⚠ Audit batch of {len(batch)} records failed: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["records"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["fsyncs"] += int(fsync)
+        for (_, _, future), receipt in zip(batch, receipts):
+            if not future.done():
+                future.set_result(receipt)
+
+# Singleton instance
+audit_writer = AuditWriter(audit_log)
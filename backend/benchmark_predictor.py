@@ -0,0 +1,247 @@
+"""
+Link-prediction benchmark for InteractionPredictor
+Holds out a fraction of the interaction graph's edges, trains embeddings on the rest and scores the
+held-out pairs through the predictor, reporting quality (AUC, precision@k) and cost (training wall
+time, peak RSS, prediction latency) as JSON so runs can be compared between commits. Both serving
+paths are measured on the same embeddings: float32 and int8-quantized (EMBEDDING_QUANTIZE).
+
+    python -m backend.benchmark_predictor --method node2vec --num-walks 20 --out bench.json
+    python -m backend.benchmark_predictor --method spectral --synthetic 30000:300000
+
+Uses data/ddinter.csv when present, otherwise (or with --synthetic) a generated graph.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    DDINTER_PATH, EMBEDDING_DIM, EMBEDDING_METHOD, NUM_WALKS, SPECTRAL_SOLVER, WALK_LENGTH, WALK_P, WALK_Q
+)
+from .embedding_store import EmbeddingStore, embedding_bytes
+from .graph_builder import drug_graph
+from .interaction_graph import InteractionGraph
+from .ml_prediction import InteractionPredictor
+from .ml_training import EMBEDDING_METHODS, fit_embeddings
+
+REGIMEN_SIZE = 30  # Drugs per batch-latency regimen (435 pairs)
+
+
+class HeldOutGraph(NamedTuple):
+    """The graph source the benchmarked predictors read, in place of the app's GraphBuilder."""
+    csr: InteractionGraph
+    version: str
+
+
+def synthetic_graph(drugs: int, edges: int, seed: int = 0) -> InteractionGraph:
+    """
+    Clustered random graph: drugs fall into classes of about 50, and 90% of interactions stay within
+    a class - enough structure for embeddings to have something to find.
+    """
+    rng = np.random.default_rng(seed)
+    classes = max(drugs // 50, 1)
+    label = rng.integers(0, classes, drugs)
+    members = np.argsort(label, kind="stable")
+    starts = np.searchsorted(label[members], np.arange(classes + 1))
+    # Draw extra pairs, since self-pairs and duplicates are dropped
+    draws = int(edges * 1.3) + 16
+    a = rng.integers(0, drugs, draws)
+    own = label[a]
+    size = starts[own + 1] - starts[own]
+    b = members[starts[own] + (rng.random(draws) * size).astype(np.int64)]
+    cross = rng.random(draws) < 0.1
+    b[cross] = rng.integers(0, drugs, cross.sum())
+    keep = a != b
+    lo, hi = np.minimum(a, b)[keep], np.maximum(a, b)[keep]
+    keys = np.unique(lo.astype(np.int64) * drugs + hi)
+    keys = keys[rng.permutation(len(keys))[:edges]]
+    severity = rng.integers(0, 4, len(keys)).astype(np.uint8)
+    return InteractionGraph([f"drug {i}" for i in range(drugs)], keys // drugs, keys % drugs, severity)
+
+
+def split_edges(csr: InteractionGraph, holdout: float, rng: np.random.Generator
+                ) -> Tuple[InteractionGraph, np.ndarray, np.ndarray]:
+    """The training graph (same drugs) and the held-out edges as (src, dst) ID arrays."""
+    src, dst, severity = csr.edge_arrays()
+    held = rng.random(len(src)) < holdout
+    train = InteractionGraph(csr.names, src[~held], dst[~held], severity[~held])
+    return train, src[held], dst[held]
+
+
+def latency_ms(fn, repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return {"median": round(float(np.median(samples)), 4), "p95": round(float(np.percentile(samples, 95)), 4),
+            "repeat": repeat}
+
+
+def peak_rss_mb() -> Optional[Dict[str, float]]:
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return None
+    # ru_maxrss is in KiB on Linux; "children" covers walk workers
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+                              cwd=str(DDINTER_PATH.parent.parent)).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def evaluate(predictor: InteractionPredictor, pairs: List[Tuple[str, str]], labels: np.ndarray,
+             partners: Dict[int, set], query_ids: List[int], ks: List[int], pick: List[List[int]],
+             regimen: List[str]) -> Dict[str, Any]:
+    """Quality and serving cost of one predictor on the held-out split."""
+    from sklearn.metrics import roc_auc_score
+
+    names, index = predictor.graph_source.csr.names, predictor.graph_source.csr.index
+    # Quality: held-out interactions against non-interacting pairs, scored like /api/predict_interaction
+    scores = np.array([r["score"] for r in predictor.predict_pairs(pairs)])
+    auc = float(roc_auc_score(labels, scores)) if 0 < labels.sum() < len(labels) else None
+    # Discovery: how many of a drug's top-k suggestions are its held-out interactions
+    hits = {k: [] for k in ks}
+    for drug in query_ids:
+        suggested = [index[r["drug"]] for r in predictor.similar_drugs(names[drug], max(ks)) or []]
+        for k in ks:
+            hits[k].append(len(partners[drug].intersection(suggested[:k])) / k)
+
+    repeat = len(pick)
+    turn = iter(range(10 ** 9))
+    single = latency_ms(lambda: predictor.predict(*(names[i] for i in pick[next(turn) % repeat])), repeat)
+    batch = latency_ms(lambda: predictor.predict_regimen(regimen), repeat)
+    turn = iter(range(10 ** 9))
+    similar = latency_ms(lambda: predictor.similar_drugs(names[pick[next(turn) % repeat][0]], max(ks)), repeat)
+    return {
+        "scores": scores,
+        "auc": round(auc, 4) if auc is not None else None,
+        "precision_at_k": {str(k): round(float(np.mean(v)), 4) if v else None for k, v in hits.items()},
+        "embedding_bytes": embedding_bytes(predictor.embeddings),
+        "predict_ms": single,
+        "batch_predict_ms": dict(batch, pairs=len(regimen) * (len(regimen) - 1) // 2),
+        "similar_drugs_ms": similar
+    }
+
+
+def run(method: str, holdout: float, seed: int, ks: List[int], synthetic: Optional[Tuple[int, int]],
+        num_walks: int, queries: int, repeat: int) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    if synthetic is None and DDINTER_PATH.exists():
+        full, source = drug_graph.csr, "ddinter.csv"
+    else:
+        drugs, edges = synthetic or (2000, 20000)
+        full, source = synthetic_graph(drugs, edges, seed), f"synthetic {drugs}:{edges}"
+    train, held_a, held_b = split_edges(full, holdout, rng)
+    neg_a, neg_b = full.sample_non_edges(len(held_a), rng)
+    # The predictors see the training graph, so held-out pairs are unknown to them - as a new interaction would be
+    graph = HeldOutGraph(train, "holdout")
+    print(f"ℹ {source}: {full.num_nodes} drugs, {train.num_edges} training and {len(held_a)} held-out interactions")
+
+    src, dst, severity = train.edge_arrays()
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    vocab, vectors = fit_embeddings(method, train.names, src, dst, severity, num_walks=num_walks)
+    train_seconds = time.perf_counter() - start
+    rss_after = peak_rss_mb()
+    print(f"✓ Trained {method} embeddings in {train_seconds:.2f}s")
+
+    # Discovery queries: drugs with held-out interactions, each scored against its held-out partners
+    partners: Dict[int, set] = {}
+    for a, b in zip(held_a.tolist(), held_b.tolist()):
+        partners.setdefault(a, set()).add(b)
+        partners.setdefault(b, set()).add(a)
+    query_ids = list(partners)
+    if len(query_ids) > queries:
+        query_ids = rng.choice(query_ids, queries, replace=False).tolist()
+    names = train.names
+    pairs = [(names[a], names[b]) for a, b in zip(np.concatenate([held_a, neg_a]).tolist(),
+                                                   np.concatenate([held_b, neg_b]).tolist())]
+    labels = np.concatenate([np.ones(len(held_a)), np.zeros(len(neg_a))])
+    pick = rng.integers(0, len(names), (repeat, 2)).tolist()
+    regimen = [names[i] for i in rng.choice(len(names), min(REGIMEN_SIZE, len(names)), replace=False).tolist()]
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-embeddings-") as tmp:
+        InteractionPredictor(EmbeddingStore(tmp), graph).install(vocab, vectors, graph.version, method=method)
+        for label, quantized in (("float32", False), ("int8", True)):
+            predictor = InteractionPredictor(EmbeddingStore(tmp, quantized=quantized), graph)
+            results[label] = evaluate(predictor, pairs, labels, partners, query_ids, ks, pick, regimen)
+    float_scores, int8_scores = results["float32"].pop("scores"), results["int8"].pop("scores")
+    error = np.abs(float_scores - int8_scores)
+    # How far serving from int8 moves the numbers, against the float32 path on the same embeddings
+    results["int8"]["score_error"] = {"max": round(float(error.max()), 6) if len(error) else None,
+                                      "mean": round(float(error.mean()), 6) if len(error) else None}
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()},
+        "config": {
+            "method": method, "embedding_dim": EMBEDDING_DIM, "num_walks": num_walks, "walk_length": WALK_LENGTH,
+            "walk_p": WALK_P, "walk_q": WALK_Q, "spectral_solver": SPECTRAL_SOLVER, "holdout": holdout, "seed": seed
+        },
+        "graph": {"source": source, "drugs": full.num_nodes, "interactions": full.num_edges,
+                  "training_interactions": train.num_edges, "held_out": len(held_a)},
+        "training": {
+            "seconds": round(train_seconds, 3),
+            "peak_rss_mb": {"before": rss_before, "after": rss_after}
+        },
+        "queries": len(query_ids),
+        "float32": results["float32"],
+        "int8": results["int8"]
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Link-prediction quality and cost benchmark for the predictor")
+    parser.add_argument("--method", choices=EMBEDDING_METHODS, default=EMBEDDING_METHOD)
+    parser.add_argument("--holdout", type=float, default=0.1, help="Fraction of interactions held out")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, action="append", help="precision@k cut-off (repeatable; default 10)")
+    parser.add_argument("--synthetic", metavar="DRUGS:EDGES",
+                        help="Benchmark a generated graph even if ddinter.csv exists (default 2000:20000)")
+    parser.add_argument("--num-walks", type=int, default=NUM_WALKS, help="Node2Vec walks per drug")
+    parser.add_argument("--queries", type=int, default=200, help="Drugs sampled for precision@k")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per latency measurement")
+    parser.add_argument("--out", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    synthetic = None
+    if args.synthetic:
+        try:
+            drugs, edges = (int(part) for part in args.synthetic.split(":"))
+        except ValueError:
+            parser.error("--synthetic expects DRUGS:EDGES, e.g. 2000:20000")
+        synthetic = (drugs, edges)
+    if not 0 < args.holdout < 1:
+        parser.error("--holdout must be between 0 and 1")
+
+    report = run(args.method, args.holdout, args.seed, sorted(set(args.k or [10])), synthetic,
+                 args.num_walks, args.queries, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"✓ Wrote {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,45 +1,155 @@
-import json
-import hashlib
 import time
-from typing import List, Dict, Any
-from .config import AUDIT_CHAIN_PATH
+import threading
+from collections.abc import Sequence
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Tuple
+from .audit_store import AuditStore, canonical_block_hash
+from .merkle import leaf_hash, merkle_root, merkle_proof
 
 class Block:
-    def __init__(self, index: int, timestamp: float, data: Dict[str, Any], previous_hash: str):
+    def __init__(self, index: int, timestamp: float, data: Dict[str, Any], previous_hash: str,
+                 records: List[Dict[str, Any]] = None):
         self.index = index
         self.timestamp = timestamp
         self.data = data
         self.previous_hash = previous_hash
+        # Batched blocks keep their records outside the hashed fields; data carries their Merkle root
+        self.records = records
         self.hash = self.calculate_hash()
 
     def calculate_hash(self) -> str:
-        block_string = json.dumps(self.__dict__, sort_keys=True).encode()
-        return hashlib.sha256(block_string).hexdigest()
+        return canonical_block_hash({
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "data": self.data,
+            "previous_hash": self.previous_hash
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        block_data = {
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "data": self.data,
+            "previous_hash": self.previous_hash,
+            "hash": self.hash
+        }
+        if self.records is not None:
+            block_data["records"] = self.records
+        return block_data
+
+    @classmethod
+    def from_dict(cls, block_data: Dict[str, Any]) -> "Block":
+        # Reconstruct block without re-calculating hash to preserve integrity
+        block = cls.__new__(cls)
+        block.index = block_data['index']
+        block.timestamp = block_data['timestamp']
+        block.data = block_data['data']
+        block.previous_hash = block_data['previous_hash']
+        block.records = block_data.get('records')
+        block.hash = block_data['hash']  # Restore original hash
+        return block
+
+class ChainView(Sequence):
+    """Read-only list view of the chain. Blocks are loaded from their segment on access."""
+
+    def __init__(self, store: AuditStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Block.from_dict(self.store.read_block(index))
 
 class Blockchain:
-    def __init__(self):
-        self.chain: List[Block] = []
+    def __init__(self, store: AuditStore = None):
+        self.store = store or AuditStore()
+        self.chain = ChainView(self.store)
+        self.on_append: List[Callable[[List[Dict[str, Any]]], None]] = []  # e.g. search indexes
+        self._lock = threading.Lock()
         self.load_chain()
 
     def create_genesis_block(self):
         genesis_block = Block(0, time.time(), {"message": "Genesis Block"}, "0")
-        self.chain.append(genesis_block)
-        self.save_chain()
+        self.store.append([genesis_block.to_dict()], fsync=True)
+
+    def refresh(self):
+        """Sees blocks appended by other worker processes."""
+        with self._lock:
+            self.store.refresh()
 
     def get_latest_block(self) -> Block:
         return self.chain[-1]
 
-    def add_block(self, data: Dict[str, Any]) -> str:
-        latest_block = self.get_latest_block()
-        new_block = Block(
-            index=latest_block.index + 1,
-            timestamp=time.time(),
-            data=data,
-            previous_hash=latest_block.hash
-        )
-        self.chain.append(new_block)
-        self.save_chain()
-        return new_block.hash
+    def add_record_batch(self, records: List[Tuple[float, Dict[str, Any]]], fsync: bool = False) -> List[Dict[str, Any]]:
+        """
+        Packs (timestamp, data) records into a single Merkle block.
+        Returns one receipt per record: where it landed and the leaf hash to prove it.
+        """
+        entries = [{"timestamp": timestamp, "data": data} for timestamp, data in records]
+        leaves = [leaf_hash(entry) for entry in entries]
+        with self._lock, self.store.lock():
+            self.store.refresh(repair=True)  # Another worker may have moved the tip
+            latest = self.store.header(-1)
+            new_block = Block(
+                index=latest.index + 1,
+                timestamp=max(time.time(), latest.timestamp),
+                data={"merkle_root": merkle_root(leaves), "record_count": len(entries)},
+                previous_hash=latest.hash,
+                records=entries
+            )
+            blocks = [new_block.to_dict()]
+            self.store.append(blocks, fsync=fsync)
+        # Listeners run outside the cross-process lock so a slow one never stalls other writers
+        self._notify(blocks)
+        return [
+            {"block_index": new_block.index, "block_hash": new_block.hash, "position": position, "leaf_hash": leaf}
+            for position, leaf in enumerate(leaves)
+        ]
+
+    def _notify(self, blocks: List[Dict[str, Any]]):
+        for listener in self.on_append:
+            try:
+                listener(blocks)
+            except Exception as e:
+                # Derived data only - listeners catch up from the log later
+                print(f"⚠ Audit append listener failed: {e}")
+
+    def get_inclusion_proof(self, block_index: int, position: int) -> Dict[str, Any]:
+        """
+        Proof that one record is in a batched block: the record, its leaf hash, the
+        O(log n) sibling path to the Merkle root, and the block header that commits to that root.
+        """
+        if not 0 <= block_index < len(self.chain):
+            raise IndexError(f"Block {block_index} does not exist")
+        block = self.chain[block_index]
+        if block.records is None:
+            raise ValueError(f"Block {block_index} holds a single record; its block hash covers it directly")
+        if not 0 <= position < len(block.records):
+            raise IndexError(f"Block {block_index} has no record {position}")
+        leaves = [leaf_hash(entry) for entry in block.records]
+        return {
+            "record": block.records[position],
+            "leaf_hash": leaves[position],
+            "proof": merkle_proof(leaves, position),
+            "merkle_root": block.data["merkle_root"],
+            "block": {
+                "index": block.index,
+                "timestamp": block.timestamp,
+                "data": block.data,
+                "previous_hash": block.previous_hash,
+                "hash": block.hash
+            }
+        }
+
+    def find_index(self, timestamp: float) -> int:
+        """Position of the first block stamped at/after `timestamp`."""
+        return self.store.find_index(timestamp)
+
+    def iter_blocks(self, indices: Iterable[int]) -> Iterator[Dict[str, Any]]:
+        """Yields block dicts one at a time so callers never hold a copy of the whole chain."""
+        return self.store.iter_blocks(indices)
 
     def is_chain_valid(self) -> bool:
         for i in range(1, len(self.chain)):
@@ -53,32 +163,12 @@ class Blockchain:
                 return False
         return True
 
-    def save_chain(self):
-        chain_data = [block.__dict__ for block in self.chain]
-        with open(AUDIT_CHAIN_PATH, 'w') as f:
-            json.dump(chain_data, f, indent=4)
-
     def load_chain(self):
-        if AUDIT_CHAIN_PATH.exists():
-            try:
-                with open(AUDIT_CHAIN_PATH, 'r') as f:
-                    chain_data = json.load(f)
-                    self.chain = []
-                    for block_data in chain_data:
-                        # Reconstruct block without re-calculating hash initially to preserve integrity
-                        block = Block(
-                            block_data['index'],
-                            block_data['timestamp'],
-                            block_data['data'],
-                            block_data['previous_hash']
-                        )
-                        block.hash = block_data['hash'] # Restore original hash
-                        self.chain.append(block)
-            except (json.JSONDecodeError, KeyError):
-                self.chain = []
+        # Segment indexes are memory-mapped; block bodies stay on disk until read
+        with self._lock, self.store.lock():
+            self.store.refresh(repair=True)
+            if len(self.store) == 0:
                 self.create_genesis_block()
-        else:
-            self.create_genesis_block()
 
 # Singleton instance
 audit_log = Blockchain()
@@ -0,0 +1,158 @@
+"""
+Training for the hybrid interaction classifier
+A multinomial logistic regression over pair features drawn from every signal the backend has:
+shared body regions (region_mapper, with drug_knowledge's class fallback), the pair of drug classes,
+graph degrees and embedding similarity. It is fitted in the embedding training process, on the graph's
+known interactions labelled with their severity against sampled non-interacting pairs, and its
+coefficients are stored next to the embeddings. Importing this module loads no graph or model.
+"""
+import functools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import CLASSIFIER_CACHE_SIZE, CLASSIFIER_MAX_EDGES, CLASSIFIER_NEGATIVE_RATIO
+from .drug_knowledge import drug_knowledge
+from .embedding_store import EmbeddingSet, unit_rows
+from .interaction_graph import SEVERITY_LEVELS, InteractionGraph
+from .region_mapper import region_mapper
+
+REGIONS = tuple(sorted(set(region_mapper.all_regions).union(
+    region_mapper.default_regions, *region_mapper.drug_mapping.values(),
+    *(data["regions"] for data in drug_knowledge.drug_classes.values())
+)))
+_REGION_INDEX = {region: i for i, region in enumerate(REGIONS)}
+DRUG_CLASSES = ("unknown",) + tuple(sorted(
+    set(drug_knowledge.drug_classes).union(drug_knowledge.drug_suffixes.values()) - {"unknown"}
+))
+_CLASS_INDEX = {name: i for i, name in enumerate(DRUG_CLASSES)}
+FEATURES = ("shared_regions", "region_jaccard", "min_log_degree", "max_log_degree",
+            "embedding_similarity", "embedded", "same_class")
+_GRAPH_FEATURES = slice(2, 6)  # Zero for pairs involving a drug outside the graph
+# Outcome 0 is "no interaction"; outcome c + 1 is severity code c
+OUTCOMES = ("None",) + SEVERITY_LEVELS
+# Training pairs shown without their graph features, so drugs the graph has never seen are scored
+# from regions and classes instead of being extrapolated as degree-zero outliers
+GRAPH_DROPOUT = 0.2
+VALIDATION_FRACTION = 0.1
+
+
+@functools.lru_cache(maxsize=CLASSIFIER_CACHE_SIZE)
+def drug_profile(name: str) -> Tuple[np.ndarray, int]:
+    """A drug's region mask over REGIONS and its index into DRUG_CLASSES (class matching is fuzzy, so cached)."""
+    info = drug_knowledge.get_drug_info(name, region_mapper)
+    regions = np.zeros(len(REGIONS), dtype=bool)
+    regions[[_REGION_INDEX[r] for r in info["regions"] if r in _REGION_INDEX]] = True
+    regions.flags.writeable = False  # Shared by every caller of the cache
+    drug_class, _ = drug_knowledge.identify_drug_class(name)
+    return regions, _CLASS_INDEX.get(drug_class, 0)
+
+
+def pair_features(names: List[str], first: np.ndarray, second: np.ndarray, csr: InteractionGraph,
+                  embeddings: Optional[EmbeddingSet]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Features of the pairs (names[first[k]], names[second[k]]): a float32 (pairs, len(FEATURES)) matrix
+    and each pair's class-pair slot. Every distinct drug is looked up once.
+    """
+    profiles = [drug_profile(name) for name in names]
+    regions = np.array([p[0] for p in profiles], dtype=np.float32).reshape(len(names), len(REGIONS))
+    classes = np.array([p[1] for p in profiles], dtype=np.int64)
+    sizes = regions.sum(axis=1)
+    ids = np.array([csr.index.get(name, -1) for name in names], dtype=np.int64)
+    safe = np.maximum(ids, 0)
+    log_degree = np.where(ids >= 0, np.log1p(csr.indptr[safe + 1] - csr.indptr[safe]), 0.0)
+
+    shared = np.einsum("ij,ij->i", regions[first], regions[second])
+    features = np.zeros((len(first), len(FEATURES)), dtype=np.float32)
+    features[:, 0] = shared
+    features[:, 1] = shared / np.maximum(sizes[first] + sizes[second] - shared, 1)
+    features[:, 2] = np.minimum(log_degree[first], log_degree[second])
+    features[:, 3] = np.maximum(log_degree[first], log_degree[second])
+    if embeddings is not None:
+        rows = np.array([embeddings.index.get(name, -1) for name in names], dtype=np.int64)
+        embedded = (rows[first] >= 0) & (rows[second] >= 0)
+        if embedded.any():
+            unit = unit_rows(embeddings, np.maximum(rows, 0))
+            features[embedded, 4] = np.einsum("ij,ij->i", unit[first[embedded]], unit[second[embedded]])
+        features[:, 5] = embedded
+    # A pair with a drug the graph has never seen is scored like the graph-less pairs of training
+    features[(ids[first] < 0) | (ids[second] < 0), _GRAPH_FEATURES] = 0
+    features[:, 6] = (classes[first] == classes[second]) & (classes[first] > 0)
+    low, high = np.minimum(classes[first], classes[second]), np.maximum(classes[first], classes[second])
+    return features, low * len(DRUG_CLASSES) + high
+
+
+def outcome_probabilities(params: Dict[str, Any], features: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """(pairs, len(OUTCOMES)) probabilities under fitted coefficients."""
+    logits = ((features - params["mean"]) / params["std"]) @ params["weights"] \
+        + params["pair_weights"][pairs] + params["intercept"]
+    logits -= logits.max(axis=1, keepdims=True)
+    odds = np.exp(logits)
+    return odds / odds.sum(axis=1, keepdims=True)
+
+
+def fit_classifier(csr: InteractionGraph, embeddings: Optional[EmbeddingSet], seed: int = 0) -> Dict[str, Any]:
+    """
+    Fits on the known interactions of `csr` plus sampled non-interacting pairs. Returns the coefficients
+    and fit statistics as a dict of arrays, ready to be stored with the embeddings.
+    """
+    from scipy.sparse import csr_matrix, hstack
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import roc_auc_score
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    src, dst, severity = csr.edge_arrays()
+    if len(src) > CLASSIFIER_MAX_EDGES:
+        keep = rng.choice(len(src), CLASSIFIER_MAX_EDGES, replace=False)
+        src, dst, severity = src[keep], dst[keep], severity[keep]
+    neg_a, neg_b = csr.sample_non_edges(len(src) * CLASSIFIER_NEGATIVE_RATIO, rng)
+    first = np.concatenate([src, neg_a]).astype(np.int64)
+    second = np.concatenate([dst, neg_b]).astype(np.int64)
+    outcome = np.concatenate([severity.astype(np.int64) + 1, np.zeros(len(neg_a), dtype=np.int64)])
+    if len(np.unique(outcome)) < 2:
+        raise ValueError("need both interacting and non-interacting pairs to train")
+
+    features, pairs = pair_features(csr.names, first, second, csr, embeddings)
+    features[rng.random(len(features)) < GRAPH_DROPOUT, _GRAPH_FEATURES] = 0
+    mean, std = features.mean(axis=0), features.std(axis=0)
+    std[std == 0] = 1.0
+    slots = len(DRUG_CLASSES) ** 2
+    design = hstack([
+        csr_matrix((features - mean) / std),
+        csr_matrix((np.ones(len(pairs), dtype=np.float32), (np.arange(len(pairs)), pairs)),
+                   shape=(len(pairs), slots))
+    ]).tocsr()
+    validation = rng.random(len(outcome)) < VALIDATION_FRACTION
+    clf = LogisticRegression(max_iter=300)
+    clf.fit(design[~validation], outcome[~validation])
+
+    # Expand to every outcome; one missing from the data (e.g. no Unknown severities) is never predicted
+    coef = np.zeros((len(OUTCOMES), design.shape[1]), dtype=np.float32)
+    intercept = np.full(len(OUTCOMES), -np.inf, dtype=np.float32)
+    if len(clf.classes_) == 2:  # sklearn fits a single binary logit
+        coef[clf.classes_[1]], intercept[clf.classes_] = clf.coef_[0], (0.0, clf.intercept_[0])
+    else:
+        coef[clf.classes_], intercept[clf.classes_] = clf.coef_, clf.intercept_
+    # Negatives were sampled far more sparsely than they occur; shifting the "None" logit by the log
+    # ratio of sampling rates turns the balanced-sample probabilities back into per-pair ones
+    total_pairs = csr.num_nodes * (csr.num_nodes - 1) // 2
+    intercept[0] += np.log((total_pairs - csr.num_edges) / max(len(neg_a), 1)) - np.log(csr.num_edges / len(src))
+    params = {
+        "mean": mean, "std": std, "weights": coef[:, :len(FEATURES)].T.copy(),
+        "pair_weights": coef[:, len(FEATURES):].T.copy(), "intercept": intercept
+    }
+    auc = np.nan
+    if validation.any() and 0 < (outcome[validation] > 0).sum() < validation.sum():
+        probabilities = outcome_probabilities(params, features[validation], pairs[validation])
+        auc = roc_auc_score(outcome[validation] > 0, 1 - probabilities[:, 0])
+    params.update(auc=np.float64(auc), samples=np.int64((~validation).sum()),
+                  seconds=np.float64(time.perf_counter() - start), trained_at=np.float64(time.time()))
+    return params
+
+
+def compatible(params: Dict[str, Any]) -> bool:
+    """Whether stored coefficients match this code's features and class list (a version may predate a change)."""
+    return (params["weights"].shape == (len(FEATURES), len(OUTCOMES))
+            and params["pair_weights"].shape == (len(DRUG_CLASSES) ** 2, len(OUTCOMES)))
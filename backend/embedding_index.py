@@ -0,0 +1,40 @@
+"""
+Approximate nearest-neighbour search over drug embeddings
+Random-hyperplane LSH: each table hashes a unit vector to the signs of its projections onto a few
+random planes, so drugs with a small angle between them tend to share a bucket. A query reads its own
+bucket plus the buckets one bit away in every table and ranks that short candidate list exactly.
+"""
+import numpy as np
+
+from .config import ANN_TABLES, ANN_BUCKET_SIZE
+
+
+class LSHIndex:
+    def __init__(self, unit: np.ndarray, tables: int = ANN_TABLES, bucket_size: int = ANN_BUCKET_SIZE,
+                 seed: int = 0):
+        """Indexes the rows of `unit` (unit-length vectors). Bits per table grow with the vocabulary."""
+        count, dim = unit.shape
+        self.tables = tables
+        self.bits = int(np.clip(np.log2(max(count, 2) / bucket_size), 1, 24))
+        self.planes = np.random.default_rng(seed).standard_normal((dim, tables * self.bits)).astype(np.float32)
+        self._weights = np.left_shift(1, np.arange(self.bits, dtype=np.int64))
+        # Table t owns the key range [t << bits, (t + 1) << bits), so all tables share one sorted array
+        self._offsets = np.left_shift(np.arange(tables, dtype=np.int64), self.bits)
+        keys = self._keys(unit).ravel()
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.rows = (order // tables).astype(np.int64)
+
+    def _keys(self, vectors: np.ndarray) -> np.ndarray:
+        signs = (np.asarray(vectors, dtype=np.float32) @ self.planes > 0).reshape(len(vectors), self.tables, self.bits)
+        return signs @ self._weights + self._offsets
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """Distinct rows sharing a bucket with `query`, or one bit away from it, in any table."""
+        keys = self._keys(query[None, :])[0]
+        # Multi-probe: the query's bucket plus every single-bit flip (the table offset bits are untouched)
+        probes = (keys[:, None] ^ np.concatenate([[0], self._weights])[None, :]).ravel()
+        starts = np.searchsorted(self.keys, probes, side="left")
+        lengths = np.searchsorted(self.keys, probes, side="right") - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return np.unique(self.rows[np.arange(lengths.sum(), dtype=np.int64) + offsets])
@@ -0,0 +1,220 @@
+"""
+On-disk store for trained drug embeddings
+One directory per graph version holding a float32 matrix (.npy) and its vocabulary. Workers open
+the matrix with mmap, so every process shares one physical copy through the page cache and a
+restart serves predictions without retraining. Each version also keeps an int8 copy of the unit
+vectors (one record per drug: float32 scale + int8 codes), which a quantized store serves instead,
+and the interaction classifier fitted alongside them, so workers load its coefficients rather than refit.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import namedtuple
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .config import EMBEDDING_QUANTIZE, EMBEDDINGS_DIR, EMBEDDINGS_KEEP_VERSIONS
+
+MODEL_FILE = "word2vec.model"
+SCRATCH_PREFIX = ".model-"
+SCRATCH_MAX_AGE = 24 * 3600  # Seconds before an uninstalled job model counts as abandoned
+
+QUANTIZED_FILE = "unit_q8.npy"
+CLASSIFIER_FILE = "classifier.npz"
+SCAN_BLOCK = 16384  # Rows decoded at a time when scanning quantized vectors
+
+# `unit` holds the rows of `vectors` scaled to length 1, so a cosine similarity is a plain dot product.
+# In a quantized set `unit` holds int8 codes and `scale` their per-row factors (unit ~ codes * scale);
+# both are views of one packed array, and `vectors` is None. `classifier` holds the interaction
+# classifier's coefficients (classifier_training.fit_classifier) when one was fitted with the embeddings.
+EmbeddingSet = namedtuple("EmbeddingSet", ["vocab", "index", "vectors", "unit", "version", "scale", "classifier"],
+                          defaults=(None, None))
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+
+def quantize_rows(unit: np.ndarray) -> np.ndarray:
+    """Packs rows as int8 codes with one float32 scale each, in a single (count,) record array."""
+    unit = np.asarray(unit, dtype=np.float32)
+    packed = np.zeros(len(unit), dtype=np.dtype([("scale", "<f4"), ("codes", "i1", (unit.shape[1],))]))
+    if len(unit):
+        scale = np.abs(unit).max(axis=1) / 127
+        packed["scale"] = scale
+        packed["codes"] = np.rint(unit / np.where(scale > 0, scale, 1)[:, None])
+    return packed
+
+
+def make_embedding_set(vocab: List[str], vectors: Optional[np.ndarray], version: str,
+                       unit: Optional[np.ndarray] = None, packed: Optional[np.ndarray] = None,
+                       classifier: Optional[Dict[str, Any]] = None) -> EmbeddingSet:
+    index = {name: i for i, name in enumerate(vocab)}
+    if packed is not None:
+        return EmbeddingSet(vocab=vocab, index=index, vectors=None, unit=packed["codes"], version=version,
+                            scale=packed["scale"], classifier=classifier)
+    return EmbeddingSet(
+        vocab=vocab, index=index, vectors=vectors,
+        unit=normalize_rows(vectors) if unit is None else unit, version=version, classifier=classifier
+    )
+
+
+def unit_rows(embeddings: EmbeddingSet, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """float32 unit vectors for `rows` (default: all); a quantized set decodes just those rows."""
+    unit = embeddings.unit if rows is None else embeddings.unit[rows]
+    if embeddings.scale is None:
+        return np.asarray(unit)
+    scale = embeddings.scale if rows is None else embeddings.scale[rows]
+    return np.asarray(unit, dtype=np.float32) * np.asarray(scale)[:, None]
+
+
+def similarities(embeddings: EmbeddingSet, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Cosine similarity of a unit `query` to `rows` (default: all). On a quantized set the dot products
+    run over the int8 codes block by block and are scaled afterwards, so no decoded matrix is built.
+    """
+    unit = embeddings.unit if rows is None else embeddings.unit[rows]
+    if embeddings.scale is None:
+        return np.asarray(unit) @ query
+    scale = embeddings.scale if rows is None else embeddings.scale[rows]
+    dots = np.empty(len(unit), dtype=np.float32)
+    for start in range(0, len(unit), SCAN_BLOCK):
+        dots[start:start + SCAN_BLOCK] = np.asarray(unit[start:start + SCAN_BLOCK], dtype=np.float32) @ query
+    return dots * scale
+
+
+def embedding_bytes(embeddings: EmbeddingSet) -> int:
+    """Size of the arrays a set serves from (mapped files count in full)."""
+    arrays = (embeddings.vectors, embeddings.unit, embeddings.scale)
+    return sum(a.size * a.itemsize for a in arrays if a is not None)
+
+
+class EmbeddingStore:
+    def __init__(self, directory: Path = EMBEDDINGS_DIR, keep_versions: int = EMBEDDINGS_KEEP_VERSIONS,
+                 quantized: bool = EMBEDDING_QUANTIZE):
+        self.directory = Path(directory)
+        self.keep_versions = keep_versions
+        self.quantized = quantized  # load() returns int8 sets
+
+    def _path(self, version: str) -> Path:
+        return self.directory / version
+
+    def has(self, version: str) -> bool:
+        return (self._path(version) / "meta.json").exists()
+
+    def model_path(self, version: str) -> Optional[Path]:
+        """The saved Word2Vec model of a version, if it has one (needed for incremental updates)."""
+        path = self._path(version) / MODEL_FILE
+        return path if self.has(version) and path.exists() else None
+
+    def scratch_path(self) -> Path:
+        """A fresh path inside the store for a training job to save its model to before install."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self.directory / f"{SCRATCH_PREFIX}{uuid.uuid4().hex[:12]}"
+
+    def save(self, version: str, vocab: List[str], vectors: np.ndarray, model_file: Optional[Path] = None,
+             classifier: Optional[Dict[str, Any]] = None, **meta):
+        """
+        Writes a version atomically: files go to a staging directory that is renamed into place.
+        A retrained model replaces the stored one; processes mapping the old files keep their view.
+        `model_file` (a scratch file) is moved in alongside the vectors, `classifier` (arrays) next to them.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        staging = self.directory / f".{version}.{uuid.uuid4().hex[:8]}"
+        staging.mkdir()
+        try:
+            files = ["vectors.npy", "unit.npy", QUANTIZED_FILE, "vocab.json", "meta.json"]
+            if model_file is not None:
+                os.replace(model_file, staging / MODEL_FILE)
+                files.append(MODEL_FILE)
+            if classifier is not None:
+                np.savez(staging / CLASSIFIER_FILE, **classifier)
+                files.append(CLASSIFIER_FILE)
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            np.save(staging / "vectors.npy", vectors)
+            unit = normalize_rows(vectors)
+            np.save(staging / "unit.npy", unit)
+            np.save(staging / QUANTIZED_FILE, quantize_rows(unit))
+            with open(staging / "vocab.json", 'w', encoding='utf-8') as f:
+                json.dump(vocab, f)
+            # meta.json is written last: its presence marks a complete version
+            with open(staging / "meta.json", 'w', encoding='utf-8') as f:
+                json.dump(dict(meta, version=version, count=len(vocab), dim=int(vectors.shape[1]),
+                               saved_at=time.time()), f)
+            for name in files:
+                with open(staging / name, 'rb') as f:
+                    os.fsync(f.fileno())
+            target = self._path(version)
+            if target.exists():
+                retired = self.directory / f".{version}.retired.{uuid.uuid4().hex[:8]}"
+                os.replace(target, retired)
+                shutil.rmtree(retired, ignore_errors=True)
+            os.replace(staging, target)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not self.has(version):
+                raise
+            return  # Another worker installed this version at the same moment
+        self.prune(keep=version)
+
+    def load(self, version: str) -> Optional[EmbeddingSet]:
+        """Memory-maps a stored version, or returns None if it was never saved."""
+        path = self._path(version)
+        if not self.has(version):
+            return None
+        try:
+            with open(path / "vocab.json", encoding='utf-8') as f:
+                vocab = json.load(f)
+            vectors = np.load(path / "vectors.npy", mmap_mode="r")
+            # Versions saved before unit.npy (or the int8 copy) existed are normalized/quantized in memory
+            unit = np.load(path / "unit.npy", mmap_mode="r") if (path / "unit.npy").exists() else None
+            packed = None
+            if self.quantized:
+                packed = np.load(path / QUANTIZED_FILE, mmap_mode="r") if (path / QUANTIZED_FILE).exists() \
+                    else quantize_rows(normalize_rows(vectors) if unit is None else unit)
+            classifier = None
+            if (path / CLASSIFIER_FILE).exists():
+                with np.load(path / CLASSIFIER_FILE) as stored:
+                    classifier = {name: stored[name] for name in stored.files}
+        except (OSError, ValueError) as e:
+            print(f"⚠ Ignoring unreadable embeddings for graph {version}: {e}")
+            return None
+        if len(vocab) != len(vectors) or (packed is not None and len(packed) != len(vocab)):
+            print(f"⚠ Ignoring embeddings for graph {version}: vocabulary and matrix sizes differ")
+            return None
+        return make_embedding_set(vocab, vectors, version, unit, packed, classifier)
+
+    def versions(self) -> List[str]:
+        """Stored versions, most recently saved first."""
+        if not self.directory.exists():
+            return []
+        stored = [p for p in self.directory.iterdir() if not p.name.startswith(".") and (p / "meta.json").exists()]
+        return [p.name for p in sorted(stored, key=lambda p: (p / "meta.json").stat().st_mtime, reverse=True)]
+
+    def latest(self) -> Optional[EmbeddingSet]:
+        for version in self.versions():
+            embeddings = self.load(version)
+            if embeddings is not None:
+                return embeddings
+        return None
+
+    def prune(self, keep: Optional[str] = None):
+        """Drops all but the newest versions. Workers still mapping a dropped file keep their view (POSIX)."""
+        for version in self.versions()[self.keep_versions:]:
+            if version != keep:
+                shutil.rmtree(self._path(version), ignore_errors=True)
+        # Models left behind by cancelled or failed jobs
+        for path in self.directory.glob(f"{SCRATCH_PREFIX}*"):
+            try:
+                if time.time() - path.stat().st_mtime > SCRATCH_MAX_AGE:
+                    path.unlink()
+            except OSError:
+                pass
+
+# Singleton instance
+embedding_store = EmbeddingStore()
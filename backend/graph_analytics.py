@@ -0,0 +1,173 @@
+"""
+Graph statistics for the analytics dashboard
+Computed once when a graph is installed and then updated from each reload's edge delta,
+so /api/analytics/summary serves a prebuilt dict instead of scanning every edge per request
+"""
+import heapq
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .config import GRAPH_TOP_DEGREE
+from .graph_builder import drug_graph
+from .interaction_graph import SEVERITY_LEVELS, GraphDelta, InteractionGraph
+
+
+class GraphAnalytics:
+    def __init__(self, top_k: int = GRAPH_TOP_DEGREE):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self.severity = np.zeros(len(SEVERITY_LEVELS), dtype=np.int64)
+        self.degrees: Dict[str, int] = {}
+        self.degree_counts: Counter = Counter()
+        self.top: list = []
+        # Union-find over drug names; component sizes are tracked per root
+        self._parent: Dict[str, str] = {}
+        self._component_size: Dict[str, int] = {}
+        self.component_counts: Counter = Counter()
+        self.num_edges = 0
+        self.version: Optional[str] = None
+        self._summary: Dict[str, Any] = {}
+
+    def summary(self) -> Dict[str, Any]:
+        """Current statistics. O(1): the dict is rebuilt on graph changes, not on reads."""
+        return self._summary
+
+    def on_graph_change(self, csr: InteractionGraph, delta: Optional[GraphDelta]):
+        if delta is None:
+            self.rebuild(csr)
+        else:
+            self.apply(csr, delta)
+
+    def rebuild(self, csr: InteractionGraph):
+        """Full computation over the CSR arrays - at startup and when a graph is replaced outright."""
+        with self._lock:
+            _, _, severity = csr.edge_arrays()
+            self.severity = np.bincount(severity, minlength=len(SEVERITY_LEVELS)).astype(np.int64)
+            degrees = csr.degrees()
+            self.degrees = dict(zip(csr.names, degrees.tolist()))
+            self.degree_counts = Counter(self.degrees.values())
+            self.num_edges = csr.num_edges
+            self._rebuild_components(csr)
+            self._rebuild_top()
+            self._publish(csr)
+
+    def apply(self, csr: InteractionGraph, delta: GraphDelta):
+        """Updates only what the delta touches."""
+        with self._lock:
+            for _, _, code in delta.added:
+                self.severity[code] += 1
+            for _, _, code in delta.removed:
+                self.severity[code] -= 1
+            for _, _, old, new in delta.changed:
+                self.severity[old] -= 1
+                self.severity[new] += 1
+            self.num_edges += len(delta.added) - len(delta.removed)
+
+            change = Counter()
+            for a, b, _ in delta.added:
+                change[a] += 1
+                change[b] += a != b  # A self-loop is stored once
+            for a, b, _ in delta.removed:
+                change[a] -= 1
+                change[b] -= a != b
+            for name, step in change.items():
+                if not step:
+                    continue
+                before = self.degrees.get(name, 0)
+                after = before + step
+                if name in self.degrees:
+                    self.degree_counts[before] -= 1
+                    if not self.degree_counts[before]:
+                        del self.degree_counts[before]
+                if after > 0:
+                    self.degrees[name] = after
+                    self.degree_counts[after] += 1
+                else:
+                    self.degrees.pop(name, None)  # The reload dropped this drug
+            # The top list only moves if a touched drug is in it or could enter it
+            floor = self.top[-1][1] if len(self.top) >= self.top_k else 0
+            in_top = {name for name, _ in self.top}
+            if any(name in in_top or self.degrees.get(name, 0) >= floor for name in change):
+                self._rebuild_top()
+
+            if delta.removed:
+                self._rebuild_components(csr)  # Union-find cannot split components
+            else:
+                for a, b, _ in delta.added:
+                    self._union(a, b)
+            self._publish(csr)
+
+    def _rebuild_top(self):
+        self.top = heapq.nlargest(self.top_k, self.degrees.items(), key=lambda item: (item[1], item[0]))
+
+    def _rebuild_components(self, csr: InteractionGraph):
+        matrix = csr_matrix((np.ones(len(csr.indices), dtype=np.int8), csr.indices, csr.indptr),
+                            shape=(csr.num_nodes, csr.num_nodes))
+        _, labels = connected_components(matrix, directed=False)
+        sizes = np.bincount(labels)
+        # The first drug seen in each component becomes its root
+        roots = np.full(len(sizes), -1, dtype=np.int64)
+        first = np.unique(labels, return_index=True)[1]
+        roots[labels[first]] = first
+        names = csr.names
+        self._parent = {name: names[roots[label]] for name, label in zip(names, labels.tolist())}
+        self._component_size = {names[roots[label]]: int(size) for label, size in enumerate(sizes.tolist())}
+        self.component_counts = Counter(self._component_size.values())
+
+    def _find(self, name: str) -> str:
+        if name not in self._parent:
+            self._parent[name] = name
+            self._component_size[name] = 1
+            self.component_counts[1] += 1
+        root = name
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[name] != root:  # Path compression
+            self._parent[name], name = root, self._parent[name]
+        return root
+
+    def _union(self, a: str, b: str):
+        ra, rb = self._find(a), self._find(b)
+        if ra == rb:
+            return
+        sa, sb = self._component_size[ra], self._component_size[rb]
+        if sa < sb:
+            ra, rb, sa, sb = rb, ra, sb, sa
+        self._parent[rb] = ra
+        del self._component_size[rb]
+        self._component_size[ra] = sa + sb
+        for size in (sa, sb):
+            self.component_counts[size] -= 1
+            if not self.component_counts[size]:
+                del self.component_counts[size]
+        self.component_counts[sa + sb] += 1
+
+    def _publish(self, csr: InteractionGraph):
+        self.version = drug_graph.version
+        self._summary = {
+            "severity_distribution": {
+                SEVERITY_LEVELS[code]: int(n) for code, n in enumerate(self.severity.tolist()) if n
+            },
+            "graph_stats": {
+                "drugs": len(self.degrees),
+                "interactions": self.num_edges,
+                "version": self.version
+            },
+            "degree_distribution": {str(degree): n for degree, n in sorted(self.degree_counts.items())},
+            "top_degree_drugs": [{"drug": name, "degree": degree} for name, degree in self.top],
+            "components": {
+                "count": sum(self.component_counts.values()),
+                "largest": max(self.component_counts, default=0),
+                "size_distribution": {str(size): n for size, n in sorted(self.component_counts.items())}
+            }
+        }
+
+# Singleton instance - kept current by the graph's change hook
+graph_analytics = GraphAnalytics()
+graph_analytics.rebuild(drug_graph.csr)
+drug_graph.on_change.append(graph_analytics.on_graph_change)
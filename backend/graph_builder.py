@@ -1,41 +1,278 @@
 import networkx as nx
+import numpy as np
 import pandas as pd
-from .config import DDINTER_PATH
+from .config import (
+    DDINTER_PATH, GRAPH_SNAPSHOT_PATH, INGEST_CHUNK_ROWS, GRAPH_PAYLOAD_CACHE_SIZE,
+    GRAPH_PATH_MAX_DEPTH, GRAPH_PATH_MAX_EXPANSIONS, GRAPH_PATH_TIME_BUDGET_MS
+)
+from .graph_snapshot import GraphSnapshot, load_snapshot, save_snapshot, source_fingerprint
+from .interaction_graph import SEVERITY_LEVELS, GraphDelta, InteractionGraph, severity_code
+import hashlib
+import json
 import random
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+def _intern_names(column: pd.Series, interned: Dict[str, int]) -> np.ndarray:
+    """
+    int32 codes of stripped, lower-cased names, assigned in first-seen order across chunks.
+    Only the categories are normalized and looked up, not every row.
+    """
+    names = column.cat.categories.astype(str).str.strip().str.lower()
+    codes = np.array([interned.setdefault(name, len(interned)) for name in names], dtype=np.int32)
+    return codes[column.cat.codes.to_numpy()]
+
+def _snapshot_from_graph(csr: InteractionGraph, meta: Dict[str, Any]) -> GraphSnapshot:
+    src, dst, severity = csr.edge_arrays()
+    return GraphSnapshot(
+        names=np.asarray(csr.names, dtype=str), src=src, dst=dst, severity=severity,
+        severity_labels=np.asarray(SEVERITY_LEVELS), meta=meta
+    )
+
+def _graph_from_snapshot(snapshot: GraphSnapshot) -> InteractionGraph:
+    # Map the snapshot's label table onto ordinal codes, whatever order it was written in
+    ordinal = np.array([severity_code(label) for label in snapshot.severity_labels.tolist()], dtype=np.uint8)
+    return InteractionGraph(snapshot.names.tolist(), snapshot.src, snapshot.dst, ordinal[snapshot.severity])
 
 class GraphBuilder:
     def __init__(self):
-        self.graph = nx.Graph()
+        self.csr = InteractionGraph.empty()
+        self.version = "empty"
+        self.ingest_stats = None
+        self.source: Optional[Dict[str, Any]] = None  # Fingerprint of the loaded CSV
+        # Called with (graph, delta) after every install; delta is None when the graph was replaced outright
+        self.on_change: List[Callable[[InteractionGraph, Optional[GraphDelta]], None]] = []
+        self._payload_cache: "OrderedDict[Tuple, Tuple[bytes, str, Optional[frozenset]]]" = OrderedDict()
+        self._payload_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
         self.load_data()
 
+    @property
+    def graph(self) -> nx.Graph:
+        """networkx view of the interaction graph, exported from the CSR arrays on first use."""
+        return self.csr.to_networkx()
+
     def load_data(self):
         """Loads data from CSV if available. Graph builder is now optional - main analysis uses region_mapper."""
         if DDINTER_PATH.exists():
             try:
-                df = pd.read_csv(DDINTER_PATH)
-                # Normalize column names
-                df.columns = [c.strip() for c in df.columns]
-                
-                # Simple mapping if columns are different, try to find drug columns
-                cols = df.columns.tolist()
-                drug_a_col = next((c for c in cols if 'drug' in c.lower() and '1' in c), cols[0])
-                drug_b_col = next((c for c in cols if 'drug' in c.lower() and '2' in c), cols[1])
-                level_col = next((c for c in cols if 'level' in c.lower()), None)
+                started = time.perf_counter()
+                snapshot = load_snapshot(GRAPH_SNAPSHOT_PATH, DDINTER_PATH)
+                if snapshot is not None:
+                    self._set_graph(_graph_from_snapshot(snapshot), snapshot.meta["source"]["sha256"][:16])
+                    self.source = snapshot.meta["source"]
+                    if snapshot.meta.get("refreshed"):
+                        try:
+                            save_snapshot(GRAPH_SNAPSHOT_PATH, snapshot)
+                        except OSError as e:
+                            print(f"⚠ Could not write graph snapshot: {e}")
+                    self.ingest_stats = dict(snapshot.meta["ingest"], snapshot=True,
+                                             load_s=round(time.perf_counter() - started, 3))
+                    print(f"✓ Loaded {self.csr.num_nodes} drugs and {self.csr.num_edges} interactions "
+                          f"from snapshot in {self.ingest_stats['load_s']}s")
+                    return
                 
-                for _, row in df.iterrows():
-                    d1 = str(row[drug_a_col]).strip().lower()
-                    d2 = str(row[drug_b_col]).strip().lower()
-                    severity = str(row[level_col]) if level_col else "Unknown"
-                    
-                    self.graph.add_edge(d1, d2, severity=severity, type="interaction")
-                    
-                print(f"✓ Loaded {len(self.graph.nodes)} drugs and {len(self.graph.edges)} interactions from CSV")
+                fingerprint = source_fingerprint(DDINTER_PATH)
+                snapshot, stats = self.read_interactions(DDINTER_PATH)
+                snapshot = snapshot._replace(meta={"source": fingerprint, "ingest": stats})
+                self._set_graph(_graph_from_snapshot(snapshot), fingerprint["sha256"][:16])
+                self.source = fingerprint
+                self.ingest_stats = dict(stats, snapshot=False)
+                print(f"✓ Loaded {self.csr.num_nodes} drugs and {self.csr.num_edges} interactions from CSV "
+                      f"({stats['rows']} rows, {stats['duplicates']} duplicates, {stats['rows_per_sec']:.0f} rows/sec)")
+                try:
+                    save_snapshot(GRAPH_SNAPSHOT_PATH, snapshot)
+                except OSError as e:
+                    print(f"⚠ Could not write graph snapshot: {e}")
                 
             except Exception as e:
                 print(f"⚠ Error loading CSV: {e}. Using region_mapper for dynamic analysis.")
         else:
             print(f"ℹ No CSV dataset found. Using region_mapper for dynamic drug analysis.")
 
+    def _set_graph(self, csr: InteractionGraph, version: Optional[str] = None, delta: Optional[GraphDelta] = None):
+        """
+        Installs a graph; `version` identifies its contents (hashed from the arrays if not given).
+        Readers take one reference to self.csr, so a swap never shows them a half-applied graph.
+        With a `delta`, cached payloads whose drugs it does not touch stay valid.
+        """
+        if version is None:
+            digest = hashlib.sha256("\n".join(csr.names).encode())
+            for array in (csr.indptr, csr.indices, csr.severity):
+                digest.update(array.tobytes())
+            version = digest.hexdigest()[:16]
+        with self._payload_lock:
+            self.csr = csr
+            self.version = version
+            if delta is None:
+                self._payload_cache.clear()
+            else:
+                for key, (_, _, drugs) in list(self._payload_cache.items()):
+                    if drugs is None or not drugs.isdisjoint(delta.touched):
+                        del self._payload_cache[key]
+        for listener in self.on_change:
+            try:
+                listener(csr, delta)
+            except Exception as e:
+                print(f"⚠ Graph change listener failed: {e}")
+
+    def graph_payload(self, min_severity: int = 0, drugs: Optional[List[str]] = None, hops: int = 1,
+                      max_nodes: Optional[int] = None, max_edges: Optional[int] = None) -> Tuple[bytes, str, str]:
+        """
+        Serialized /api/graph/data body, its ETag and the graph version. Bodies are cached per
+        query, so repeated requests skip filtering and serialization.
+        """
+        seeds = tuple(sorted({d.strip().lower() for d in drugs})) if drugs is not None else None
+        key = (min_severity, seeds, hops if seeds is not None else None, max_nodes, max_edges)
+        with self._payload_lock:
+            csr, version = self.csr, self.version
+            cached = self._payload_cache.get(key)
+            if cached is not None:
+                self._payload_cache.move_to_end(key)
+                return cached[0], cached[1], version
+
+        payload = csr.select(min_severity, seeds, hops, max_nodes, max_edges)
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        # Neighborhood payloads remember their drugs so a reload only drops the ones it touches
+        drugs_covered = None
+        if seeds is not None:
+            drugs_covered = frozenset(seeds).union(node["id"] for node in payload["nodes"])
+            if max_nodes is not None and len(payload["nodes"]) >= max_nodes:
+                # max_nodes kept the highest-degree candidates; a degree change on any candidate
+                # (even one cut) can change which survive, so all of them count as covered
+                candidates = csr.neighborhood(seeds, hops, min_severity)
+                drugs_covered = drugs_covered.union(csr.names[i] for i in candidates.tolist())
+        with self._payload_lock:
+            if self.version == version:  # The graph may have been swapped meanwhile
+                self._payload_cache[key] = (body, etag, drugs_covered)
+                while len(self._payload_cache) > GRAPH_PAYLOAD_CACHE_SIZE:
+                    self._payload_cache.popitem(last=False)
+        return body, etag, version
+
+    def reload(self, path: Path = DDINTER_PATH) -> Dict[str, Any]:
+        """
+        Re-ingests the dataset and applies only the edges that were added, removed or changed.
+        Listeners in on_change receive the new graph and its GraphDelta once it is installed.
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            fingerprint = source_fingerprint(path)
+            if self.source is not None and fingerprint["sha256"] == self.source["sha256"]:
+                self.source = fingerprint
+                return {"reloaded": False, "reason": "Dataset unchanged", "version": self.version}
+
+            ingested, stats = self.read_interactions(path)
+            previous = self.version
+            csr, delta = self.csr.apply_dataset(
+                ingested.names.tolist(), ingested.src, ingested.dst, ingested.severity
+            )
+            if delta.touched:
+                self._set_graph(csr, fingerprint["sha256"][:16], delta)
+            self.source = fingerprint
+            self.ingest_stats = dict(stats, snapshot=False)
+            try:
+                save_snapshot(GRAPH_SNAPSHOT_PATH, _snapshot_from_graph(
+                    self.csr, {"source": fingerprint, "ingest": stats}))
+            except OSError as e:
+                print(f"⚠ Could not write graph snapshot: {e}")
+
+            result = {
+                "reloaded": bool(delta.touched),
+                "previous_version": previous,
+                "version": self.version,
+                "added": len(delta.added),
+                "removed": len(delta.removed),
+                "changed": len(delta.changed),
+                "drugs_touched": len(delta.touched),
+                "elapsed_s": round(time.perf_counter() - started, 3)
+            }
+            print(f"✓ Reloaded interaction graph: +{result['added']} -{result['removed']} "
+                  f"~{result['changed']} edges in {result['elapsed_s']}s")
+            return result
+
+    def source_changed(self, path: Path = DDINTER_PATH) -> bool:
+        """Cheap size/mtime check used by the dataset watcher."""
+        if not path.exists():
+            return False
+        stat = path.stat()
+        return self.source is None or (stat.st_size, stat.st_mtime_ns) != (self.source["size"], self.source["mtime_ns"])
+
+    @staticmethod
+    def read_interactions(path: Path, chunk_rows: int = INGEST_CHUNK_ROWS) -> Tuple[GraphSnapshot, Dict[str, Any]]:
+        """
+        Reads the interaction CSV in chunks of `chunk_rows` rows with vectorized normalization.
+        Returns the unique undirected edges as a snapshot (later rows win, as with repeated
+        add_edge calls; empty meta) and ingestion stats.
+        """
+        started = time.perf_counter()
+        # Normalize column names
+        raw_cols = pd.read_csv(path, nrows=0).columns.tolist()
+        cols = [c.strip() for c in raw_cols]
+        
+        # Simple mapping if columns are different, try to find drug columns
+        drug_a_col = next((c for c in cols if 'drug' in c.lower() and '1' in c), cols[0])
+        drug_b_col = next((c for c in cols if 'drug' in c.lower() and '2' in c), cols[1])
+        level_col = next((c for c in cols if 'level' in c.lower()), None)
+        wanted = [drug_a_col, drug_b_col] + ([level_col] if level_col else [])
+        
+        interned: Dict[str, int] = {}
+        first_parts, second_parts, severity_parts = [], [], []
+        rows = skipped = 0
+        reader = pd.read_csv(
+            path, chunksize=chunk_rows,
+            usecols=lambda c: c.strip() in wanted,  # Only the columns we map; the rest are never parsed
+            # Drug names repeat on almost every row, so parse them as categories and normalize each distinct name once
+            dtype={c: "category" for c in raw_cols if c.strip() in wanted}
+        )
+        for chunk in reader:
+            chunk.columns = [c.strip() for c in chunk.columns]
+            rows += len(chunk)
+            kept = chunk.dropna(subset=[drug_a_col, drug_b_col])  # Rows missing a drug name carry no edge
+            skipped += len(chunk) - len(kept)
+            chunk = kept
+            d1 = _intern_names(chunk[drug_a_col], interned)
+            d2 = _intern_names(chunk[drug_b_col], interned)
+            if level_col:
+                severity, labels = pd.factorize(chunk[level_col].astype(object).fillna("Unknown"))
+                ordinal = np.array([severity_code(label) for label in labels], dtype=np.uint8)
+                severity_parts.append(ordinal[severity])
+            else:
+                severity_parts.append(np.zeros(len(chunk), dtype=np.uint8))
+            
+            # Undirected: (a, b) and (b, a) are the same interaction
+            first_parts.append(np.minimum(d1, d2))
+            second_parts.append(np.maximum(d1, d2))
+        
+        # One pass over packed (a, b) keys across every chunk; reversed, so the last row of a pair wins
+        first = np.concatenate(first_parts or [np.zeros(0, dtype=np.int32)])
+        second = np.concatenate(second_parts or [np.zeros(0, dtype=np.int32)])
+        severity = np.concatenate(severity_parts or [np.zeros(0, dtype=np.uint8)])
+        keys = (first.astype(np.int64) << 32) | second
+        _, reversed_last = np.unique(keys[::-1], return_index=True)
+        last = np.sort(len(keys) - 1 - reversed_last)
+        # Renumber so only drugs with an edge get a node (names from rows missing a partner are dropped)
+        codes, used = pd.factorize(np.stack([first[last], second[last]], axis=1).ravel())
+        names = np.array(list(interned), dtype=object)[used]
+        snapshot = GraphSnapshot(
+            names=np.asarray(names, dtype=str), src=codes[0::2].astype(np.int32), dst=codes[1::2].astype(np.int32),
+            severity=severity[last], severity_labels=np.asarray(SEVERITY_LEVELS), meta={}
+        )
+        
+        elapsed = time.perf_counter() - started
+        stats = {
+            "rows": rows,
+            "edges": len(last),
+            "skipped": skipped,
+            "duplicates": rows - skipped - len(last),
+            "chunk_rows": chunk_rows,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_sec": rows / elapsed if elapsed > 0 else 0.0
+        }
+        return snapshot, stats
 
     def generate_mock_data(self):
         """Generates a realistic-looking interaction graph for demo purposes."""
@@ -48,9 +285,6 @@ class GraphBuilder:
             "tramadol", "naproxen", "prednisone", "furosemide", "clopidogrel"
         ]
         
-        # Add nodes
-        self.graph.add_nodes_from(common_drugs)
-        
         # Add known risky pairs
         risky_pairs = [
             ("warfarin", "aspirin", "Major"),
@@ -67,30 +301,59 @@ class GraphBuilder:
             ("ciprofloxacin", "warfarin", "Major"),
             ("tramadol", "sertraline", "Major"),
         ]
+        known = {frozenset((d1, d2)) for d1, d2, _ in risky_pairs}
         
-        for d1, d2, sev in risky_pairs:
-            self.graph.add_edge(d1, d2, severity=sev, type="interaction")
-            
         # Add some random connections for graph density
+        potential = []
         for _ in range(20):
             d1, d2 = random.sample(common_drugs, 2)
-            if not self.graph.has_edge(d1, d2) and d1 != d2:
-                self.graph.add_edge(d1, d2, severity="Unknown", type="potential")
+            if frozenset((d1, d2)) not in known:
+                known.add(frozenset((d1, d2)))
+                potential.append((d1, d2, "Unknown"))
+        
+        self._set_graph(InteractionGraph.from_edges(risky_pairs + potential, nodes=common_drugs))
 
     def get_subgraph(self, drugs):
         """Returns a subgraph containing only the specified drugs and their direct interactions."""
         normalized_drugs = [d.strip().lower() for d in drugs]
-        # Filter for drugs that exist in the graph
-        valid_drugs = [d for d in normalized_drugs if d in self.graph]
-        return self.graph.subgraph(valid_drugs)
+        # Drugs missing from the graph are left out
+        return self.csr.subgraph(normalized_drugs)
+
+    def find_paths(self, drugs: List[str], max_depth: int = GRAPH_PATH_MAX_DEPTH, min_severity: int = 0,
+                   limit: int = 10, max_expansions: int = GRAPH_PATH_MAX_EXPANSIONS,
+                   time_budget_ms: float = GRAPH_PATH_TIME_BUDGET_MS) -> Dict[str, Any]:
+        """
+        Direct and indirect interaction chains (A-X-B, A-X-Y-B) between every pair of drugs in a regimen,
+        ranked by severity. One expansion/time budget covers the whole request, so hubs cannot stall it.
+        """
+        started = time.perf_counter()
+        csr = self.csr  # One graph for the whole search, even if a reload swaps it meanwhile
+        normalized = list(dict.fromkeys(d.strip().lower() for d in drugs))
+        present = [d for d in normalized if d in csr]
+        budget = {"expansions": max_expansions, "deadline": started + time_budget_ms / 1000}
+        pairs = []
+        for i, d1 in enumerate(present):
+            for d2 in present[i + 1:]:
+                paths, truncated = csr.paths_between(
+                    csr.index[d1], csr.index[d2], max_depth, min_severity, limit, budget
+                )
+                pairs.append({"drugs": [d1, d2], "paths": paths, "truncated": truncated})
+        return {
+            "pairs": pairs,
+            "missing": [d for d in normalized if d not in csr],
+            "truncated": any(pair["truncated"] for pair in pairs),
+            "expansions": max_expansions - budget["expansions"],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
 
     def check_interaction(self, drug_a, drug_b):
         """Checks if there is an edge between two drugs."""
         d1 = drug_a.strip().lower()
         d2 = drug_b.strip().lower()
         
-        if self.graph.has_edge(d1, d2):
-            return self.graph[d1][d2]
+        code = self.csr.edge_severity(d1, d2)
+        if code is not None:
+            return {"severity": SEVERITY_LEVELS[code], "type": "interaction"}
         return None
 
 # Singleton
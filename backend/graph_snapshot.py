@@ -0,0 +1,81 @@
+"""
+Binary snapshot of the built interaction graph
+An interned node table, int32 edge arrays and uint8 severity codes in one .npz file,
+keyed on the source CSV's size, mtime and SHA-256 so a restart skips CSV ingestion entirely
+"""
+import hashlib
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+
+GraphSnapshot = namedtuple("GraphSnapshot", ["names", "src", "dst", "severity", "severity_labels", "meta"])
+
+
+def file_sha256(path: Path, chunk_bytes: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(path: Path, sha256: Optional[str] = None) -> Dict[str, Any]:
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256 or file_sha256(path)}
+
+
+def save_snapshot(path: Path, snapshot: GraphSnapshot):
+    """Writes the snapshot atomically - a reader never sees a half-written file."""
+    meta = dict(snapshot.meta, format=SNAPSHOT_FORMAT)
+    meta.pop("refreshed", None)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            names=np.asarray(snapshot.names, dtype=str),
+            src=np.asarray(snapshot.src, dtype=np.int32),
+            dst=np.asarray(snapshot.dst, dtype=np.int32),
+            severity=np.asarray(snapshot.severity, dtype=np.uint8),
+            severity_labels=np.asarray(snapshot.severity_labels, dtype=str),
+            meta=np.asarray(json.dumps(meta))
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: Path, source_path: Path) -> Optional[GraphSnapshot]:
+    """
+    Returns the snapshot if it was built from the current contents of `source_path`, else None.
+    Size and mtime are checked first; when only the mtime differs (fresh checkout, copied deploy)
+    the source is hashed and the snapshot is still used if the contents match.
+    """
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("format") != SNAPSHOT_FORMAT:
+                return None
+            stat = source_path.stat()
+            if meta["source"]["size"] != stat.st_size:
+                return None
+            if meta["source"]["mtime_ns"] != stat.st_mtime_ns:
+                sha256 = file_sha256(source_path)
+                if sha256 != meta["source"]["sha256"]:
+                    return None
+                meta["source"] = source_fingerprint(source_path, sha256)
+                meta["refreshed"] = True  # Caller re-saves so the next start takes the fast path
+            return GraphSnapshot(
+                names=z["names"], src=z["src"], dst=z["dst"], severity=z["severity"],
+                severity_labels=z["severity_labels"], meta=meta
+            )
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠ Ignoring unreadable graph snapshot {path.name}: {e}")
+        return None
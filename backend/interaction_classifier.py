@@ -0,0 +1,128 @@
+"""
+Hybrid interaction classifier
+Scores drug pairs with the multinomial logistic regression of classifier_training: shared body regions,
+the pair of drug classes, graph degrees and embedding similarity. The model is fitted in the training
+process and stored with the embeddings, so a worker only loads its coefficients whenever the predictor
+swaps embeddings in. Per-drug features are cached, and the class pair enters as a looked-up weight rather
+than a one-hot row, so scoring a whole regimen is a handful of array operations.
+"""
+import threading
+from collections import namedtuple
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .classifier_training import compatible, drug_profile, outcome_probabilities, pair_features
+from .embedding_store import EmbeddingSet
+from .graph_builder import drug_graph
+from .interaction_graph import SEVERITY_LEVELS
+from .ml_prediction import predictor
+
+# Risk per severity code (Unknown, Minor, Moderate, Major), on the scale of the region-overlap heuristic it
+# replaces: 0.3 / 0.5 / 0.8 fall in its Minor / Moderate / Major bands, and Unknown counts as Moderate
+SEVERITY_RISK = np.array([0.5, 0.3, 0.5, 0.8])
+INTERACTION_THRESHOLD = 0.5  # Probability at which a pair is reported as interacting
+
+ClassifierModel = namedtuple("ClassifierModel", [
+    "params", "embeddings", "graph_version", "auc", "samples", "seconds", "trained_at"
+])
+
+
+class InteractionClassifier:
+    def __init__(self):
+        self.model: Optional[ClassifierModel] = None  # Swapped as a whole
+        self._lock = threading.Lock()
+        self._error = None
+        self.on_install = []  # Called with each model swapped in
+
+    @property
+    def is_trained(self):
+        return self.model is not None
+
+    def on_embeddings(self, embeddings: EmbeddingSet):
+        """Installs the classifier stored with embeddings the predictor just swapped in."""
+        params = embeddings.classifier
+        if params is None or not compatible(params):
+            # Keep scoring with the previous model (and the embeddings it was fitted with), if any
+            self._error = f"No usable classifier stored with embeddings {embeddings.version}"
+            return
+        auc = float(params["auc"])
+        model = ClassifierModel(
+            params=params, embeddings=embeddings, graph_version=embeddings.version,
+            auc=None if np.isnan(auc) else auc, samples=int(params["samples"]),
+            seconds=float(params["seconds"]), trained_at=float(params["trained_at"])
+        )
+        with self._lock:
+            self.model, self._error = model, None
+        print(f"✓ Interaction classifier loaded ({model.samples} training pairs"
+              + (f", validation AUC {model.auc:.3f})" if model.auc is not None else ")"))
+        for listener in self.on_install:
+            try:
+                listener(model)
+            except Exception as e:
+                print(f"⚠ Classifier install listener failed: {e}")
+
+    def _score(self, names: List[str], first: np.ndarray, second: np.ndarray) -> Optional[Dict[str, np.ndarray]]:
+        model = self.model
+        if model is None:
+            return None
+        csr = drug_graph.csr
+        features, pairs = pair_features(names, first, second, csr, model.embeddings)
+        probabilities = outcome_probabilities(model.params, features, pairs)
+        # Severity and risk are conditional on the pair interacting; `probability` says how likely that is
+        interacting = probabilities[:, 1:]
+        given = interacting / np.maximum(interacting.sum(axis=1, keepdims=True), 1e-12)
+        probability, severity, risk = 1.0 - probabilities[:, 0], given.argmax(axis=1), given @ SEVERITY_RISK
+
+        # Known interactions are not predicted: the graph's severity stands
+        ids = np.array([csr.index.get(name, -1) for name in names], dtype=np.int64)
+        codes = np.full(len(first), -1, dtype=np.int16)
+        in_graph = (ids[first] >= 0) & (ids[second] >= 0)
+        if in_graph.any():
+            codes[in_graph] = csr.edge_severities(ids[first[in_graph]], ids[second[in_graph]])
+        known = codes >= 0
+        probability[known], severity[known], risk[known] = 1.0, codes[known], SEVERITY_RISK[codes[known]]
+        return {"known": known, "probability": probability, "severity": severity, "risk": risk}
+
+    def _results(self, labels: List[str], first: np.ndarray, second: np.ndarray,
+                 scores: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        return [
+            {"drug_a": labels[a], "drug_b": labels[b], "known": k, "interacts": p >= INTERACTION_THRESHOLD,
+             "probability": p, "severity": SEVERITY_LEVELS[s] if p >= INTERACTION_THRESHOLD else None, "risk": r}
+            for a, b, k, p, s, r in zip(first.tolist(), second.tolist(), scores["known"].tolist(),
+                                        scores["probability"].tolist(), scores["severity"].tolist(),
+                                        scores["risk"].tolist())
+        ]
+
+    def predict_pairs(self, pairs: List[Tuple[str, str]]) -> Optional[List[Dict[str, Any]]]:
+        """Scores (drug_a, drug_b) pairs in one pass; None until a model is trained."""
+        labels = list(dict.fromkeys(name for pair in pairs for name in pair))
+        position = {name: i for i, name in enumerate(labels)}
+        ends = np.array([position[name] for pair in pairs for name in pair], dtype=np.int64).reshape(-1, 2)
+        scores = self._score([name.strip().lower() for name in labels], ends[:, 0], ends[:, 1])
+        return None if scores is None else self._results(labels, ends[:, 0], ends[:, 1], scores)
+
+    def predict_regimen(self, drugs: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Scores every pair of a regimen, in the order of a nested i < j loop; None until a model is trained."""
+        first, second = np.triu_indices(len(drugs), k=1)
+        scores = self._score([name.strip().lower() for name in drugs], first, second)
+        return None if scores is None else self._results(list(drugs), first, second, scores)
+
+    def status(self) -> Dict[str, Any]:
+        model = self.model
+        return {
+            "trained": model is not None,
+            "error": self._error,
+            "graph_version": model.graph_version if model else None,
+            "embedding_version": model.embeddings.version if model and model.embeddings is not None else None,
+            "validation_auc": round(model.auc, 4) if model and model.auc is not None else None,
+            "samples": model.samples if model else 0,
+            "train_seconds": round(model.seconds, 3) if model else None,
+            "cached_drugs": drug_profile.cache_info().currsize
+        }
+
+# Singleton instance
+interaction_classifier = InteractionClassifier()
+predictor.on_install.append(interaction_classifier.on_embeddings)
+if predictor.is_trained:
+    interaction_classifier.on_embeddings(predictor.embeddings)  # Mapped from the store at import
@@ -0,0 +1,419 @@
+"""
+Read-optimized interaction graph
+Drug names are interned to integer IDs and adjacency is stored as CSR arrays
+(indptr/indices plus a uint8 severity per entry), so lookups and neighbor scans run at array speed.
+networkx graphs are only built on demand.
+"""
+import heapq
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+
+# Ordinal severity codes - a higher code is a more serious interaction
+SEVERITY_LEVELS = ("Unknown", "Minor", "Moderate", "Major")
+_SEVERITY_CODES = {label.lower(): code for code, label in enumerate(SEVERITY_LEVELS)}
+# Path ranking weight per severity code; a path scores the product of its edge weights
+SEVERITY_WEIGHTS = np.array([0.25, 0.5, 0.75, 1.0])
+PATH_SCAN_BATCH = 256  # Frontier drugs expanded per vectorized step; the budget is checked between steps
+
+
+def severity_code(label) -> int:
+    """Ordinal code for a severity label; anything unrecognized is Unknown (0)."""
+    return _SEVERITY_CODES.get(str(label).strip().lower(), 0)
+
+
+def find_edges(indptr: np.ndarray, indices: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    CSR positions of the edges (a[k], b[k]), -1 where there is none. One vectorized bisection over
+    the sorted neighbor lists; works on plain (or memory-mapped) arrays.
+    """
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    lo, hi = indptr[a], indptr[a + 1]
+    end = hi.copy()
+    while True:
+        active = lo < hi
+        if not active.any():
+            break
+        mid = (lo + hi) // 2
+        right = active & (indices[np.minimum(mid, len(indices) - 1)] < b)
+        lo = np.where(right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+    found = lo < end
+    found[found] = indices[lo[found]] == b[found]
+    return np.where(found, lo, -1)
+
+
+# Edge-level difference between two graph versions; edges are (drug_a, drug_b, severity_code)
+GraphDelta = namedtuple("GraphDelta", ["added", "removed", "changed", "touched"])
+
+
+class InteractionGraph:
+    def __init__(self, names: Sequence[str], src: np.ndarray, dst: np.ndarray, severity: np.ndarray):
+        """Builds CSR adjacency from unique undirected edges (src[k], dst[k]) with ordinal severity codes."""
+        self.names: List[str] = list(names)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        src = np.asarray(src, dtype=np.int32)
+        dst = np.asarray(dst, dtype=np.int32)
+        severity = np.asarray(severity, dtype=np.uint8)
+        self.num_edges = len(src)
+
+        # Store both directions; a self-loop is stored once
+        reverse = src != dst
+        rows = np.concatenate([src, dst[reverse]])
+        cols = np.concatenate([dst, src[reverse]])
+        codes = np.concatenate([severity, severity[reverse]])
+        order = np.argsort(rows.astype(np.int64) * max(len(self.names), 1) + cols, kind="stable")
+        self.indices = cols[order]
+        self.severity = codes[order]
+        self.indptr = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.names)), out=self.indptr[1:])
+        # Scalar lookups bisect plain memoryviews - numpy's per-call overhead dominates single-edge checks
+        self._indptr_view = memoryview(self.indptr)
+        self._indices_view = memoryview(self.indices)
+        self._severity_view = memoryview(self.severity)
+        self._nx: Optional[nx.Graph] = None
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str, str]], nodes: Iterable[str] = ()) -> "InteractionGraph":
+        """
+        From (drug_a, drug_b, severity_label) triples; a repeated pair keeps its last severity.
+        `nodes` adds drugs that may have no interactions.
+        """
+        names: Dict[str, int] = {name: i for i, name in enumerate(dict.fromkeys(nodes))}
+        pairs: Dict[Tuple[int, int], int] = {}
+        for d1, d2, label in edges:
+            i = names.setdefault(d1, len(names))
+            j = names.setdefault(d2, len(names))
+            pairs[(min(i, j), max(i, j))] = severity_code(label)
+        ends = np.array(list(pairs), dtype=np.int32).reshape(-1, 2)
+        return cls(list(names), ends[:, 0], ends[:, 1], np.fromiter(pairs.values(), dtype=np.uint8, count=len(pairs)))
+
+    @classmethod
+    def empty(cls) -> "InteractionGraph":
+        return cls([], np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.uint8))
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def degrees(self, min_severity: int = 0) -> np.ndarray:
+        """Interactions per drug, counting only those of at least `min_severity`."""
+        if not min_severity:
+            return np.diff(self.indptr)
+        rows = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        return np.bincount(rows[self.severity >= min_severity], minlength=self.num_nodes)
+
+    def neighbor_ids(self, node_id: int) -> np.ndarray:
+        return self.indices[self.indptr[node_id]:self.indptr[node_id + 1]]
+
+    def neighbor_severities(self, node_id: int) -> np.ndarray:
+        return self.severity[self.indptr[node_id]:self.indptr[node_id + 1]]
+
+    def neighbors(self, name: str) -> List[str]:
+        node_id = self.index.get(name)
+        if node_id is None:
+            return []
+        return [self.names[j] for j in self.neighbor_ids(node_id).tolist()]
+
+    def edge_severity(self, d1: str, d2: str) -> Optional[int]:
+        """Severity code of the edge between two drugs, or None if they do not interact."""
+        i, j = self.index.get(d1), self.index.get(d2)
+        if i is None or j is None:
+            return None
+        lo, hi = self._indptr_view[i], self._indptr_view[i + 1]
+        k = bisect_left(self._indices_view, j, lo, hi)  # Neighbor lists are sorted
+        if k < hi and self._indices_view[k] == j:
+            return self._severity_view[k]
+        return None
+
+    def has_edge(self, d1: str, d2: str) -> bool:
+        return self.edge_severity(d1, d2) is not None
+
+    def edge_severities(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Severity codes of the edges (a[k], b[k]) by node ID, -1 where there is none."""
+        positions = find_edges(self.indptr, self.indices, a, b)
+        codes = np.full(len(positions), -1, dtype=np.int16)
+        found = positions >= 0
+        codes[found] = self.severity[positions[found]]
+        return codes
+
+    def sample_non_edges(self, count: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Up to `count` uniform pairs of distinct drugs (by node ID) that do not interact."""
+        a_parts, b_parts, found = [], [], 0
+        for _ in range(64 if self.num_nodes > 1 else 0):  # Bounded: a near-complete graph has few non-edges
+            if found >= count:
+                break
+            a = rng.integers(0, self.num_nodes, 2 * count)
+            b = rng.integers(0, self.num_nodes, 2 * count)
+            ok = (a != b) & (self.edge_severities(a, b) < 0)
+            a_parts.append(a[ok])
+            b_parts.append(b[ok])
+            found += int(ok.sum())
+        if not a_parts:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        return np.concatenate(a_parts)[:count], np.concatenate(b_parts)[:count]
+
+    def edge_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Each undirected edge once as (src, dst, severity) with src <= dst."""
+        rows = np.repeat(np.arange(self.num_nodes, dtype=np.int32), self.degrees())
+        once = rows <= self.indices
+        return rows[once], self.indices[once], self.severity[once]
+
+    def iter_edges(self) -> Iterator[Tuple[str, str, str]]:
+        """(drug_a, drug_b, severity_label) for every edge."""
+        src, dst, severity = self.edge_arrays()
+        for i, j, code in zip(src.tolist(), dst.tolist(), severity.tolist()):
+            yield self.names[i], self.names[j], SEVERITY_LEVELS[code]
+
+    def apply_dataset(self, names: Sequence[str], src: np.ndarray, dst: np.ndarray,
+                      severity: np.ndarray) -> Tuple["InteractionGraph", GraphDelta]:
+        """
+        Diffs a freshly ingested edge list against this graph and applies only the difference:
+        surviving edges keep their arrays (and their drugs keep their relative order), removed
+        edges are masked out, changed severities are overwritten and added edges are appended.
+        Returns the new graph (this one is left untouched for in-flight readers) and the delta.
+        """
+        union = list(self.names)
+        union_index = dict(self.index)
+        for name in names:
+            if name not in union_index:
+                union_index[name] = len(union)
+                union.append(name)
+        to_union = np.array([union_index[name] for name in names], dtype=np.int64)
+        width = max(len(union), 1)
+
+        def keys(a, b):
+            return np.minimum(a, b).astype(np.int64) * width + np.maximum(a, b)
+
+        cur_src, cur_dst, cur_severity = self.edge_arrays()
+        new_src, new_dst = to_union[np.asarray(src)], to_union[np.asarray(dst)]
+        new_severity = np.asarray(severity, dtype=np.uint8)
+        cur_keys, new_keys = keys(cur_src, cur_dst), keys(new_src, new_dst)
+        _, cur_common, new_common = np.intersect1d(cur_keys, new_keys, assume_unique=True, return_indices=True)
+        removed = np.ones(len(cur_keys), dtype=bool)
+        removed[cur_common] = False
+        added = np.ones(len(new_keys), dtype=bool)
+        added[new_common] = False
+        differs = cur_severity[cur_common] != new_severity[new_common]
+        changed_cur, changed_new = cur_common[differs], new_common[differs]
+
+        def described(a, b, codes):
+            return [(union[i], union[j], code) for i, j, code in zip(a.tolist(), b.tolist(), codes.tolist())]
+
+        delta = GraphDelta(
+            added=described(new_src[added], new_dst[added], new_severity[added]),
+            removed=described(cur_src[removed], cur_dst[removed], cur_severity[removed]),
+            changed=[(a, b, old, new) for (a, b, old), new in zip(
+                described(cur_src[changed_cur], cur_dst[changed_cur], cur_severity[changed_cur]),
+                new_severity[changed_new].tolist()
+            )],
+            touched=set()
+        )
+        for edges in (delta.added, delta.removed, delta.changed):
+            for edge in edges:
+                delta.touched.update(edge[:2])
+        if not delta.touched:
+            return self, delta
+
+        severity_out = cur_severity.copy()
+        severity_out[changed_cur] = new_severity[changed_new]
+        keep = ~removed
+        out_src = np.concatenate([cur_src[keep], new_src[added]])
+        out_dst = np.concatenate([cur_dst[keep], new_dst[added]])
+        out_severity = np.concatenate([severity_out[keep], new_severity[added]])
+
+        # Drugs left without any interaction are dropped; IDs are compacted in union order
+        used = np.zeros(len(union), dtype=bool)
+        used[out_src] = True
+        used[out_dst] = True
+        relabel = np.cumsum(used) - 1
+        out_names = [name for name, present in zip(union, used.tolist()) if present]
+        return InteractionGraph(out_names, relabel[out_src], relabel[out_dst], out_severity), delta
+
+    def paths_between(self, a: int, b: int, max_depth: int = 3, min_severity: int = 0, limit: int = 10,
+                      budget: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Simple paths of up to `max_depth` (at most 3) edges between drugs `a` and `b`, best first.
+        Bidirectional: both endpoints expand one hop and depth-3 paths are found by scanning the
+        smaller frontier's neighbors against the other frontier, strongest edges first. `budget`
+        ({"expansions": remaining neighbor entries, "deadline": perf_counter value}) is shared by the
+        caller across pairs; returns (paths, truncated).
+        """
+        budget = budget if budget is not None else {"expansions": float("inf"), "deadline": float("inf")}
+        found: List[Tuple[float, int, List[int], List[int]]] = []
+
+        def record(nodes: np.ndarray, codes: np.ndarray):
+            """Scores a batch of equal-length paths (one per row) and keeps the best `limit` overall."""
+            scores = SEVERITY_WEIGHTS[codes].prod(axis=1)
+            for i in np.argsort(-scores, kind="stable")[:limit].tolist():
+                entry = (float(scores[i]), -nodes.shape[1], nodes[i].tolist(), codes[i].tolist())
+                if len(found) < limit:
+                    heapq.heappush(found, entry)
+                elif entry > found[0]:
+                    heapq.heapreplace(found, entry)
+                else:
+                    break  # Rows are sorted; the rest score no better
+
+        def frontier(node: int) -> Tuple[np.ndarray, np.ndarray]:
+            ids, codes = self.neighbor_ids(node), self.neighbor_severities(node)
+            budget["expansions"] -= len(ids)
+            keep = codes >= min_severity
+            return ids[keep], codes[keep]
+
+        direct = self.edge_severity(self.names[a], self.names[b])
+        if direct is not None and direct >= min_severity:
+            record(np.array([[a, b]]), np.array([[direct]]))
+        truncated = False
+        if max_depth >= 2 and a != b:
+            near_a, codes_a = frontier(a)
+            near_b, codes_b = frontier(b)
+            to_b = np.full(self.num_nodes, -1, dtype=np.int16)  # Severity of x-b, -1 if no edge
+            to_b[near_b] = codes_b
+            to_a = np.full(self.num_nodes, -1, dtype=np.int16)
+            to_a[near_a] = codes_a
+
+            middle = near_a[(to_b[near_a] >= 0) & (near_a != a) & (near_a != b)]
+            if len(middle):
+                record(
+                    np.column_stack([np.full(len(middle), a), middle, np.full(len(middle), b)]),
+                    np.column_stack([to_a[middle], to_b[middle]])
+                )
+
+            if max_depth >= 3:
+                # Scan from the side whose frontier is cheaper to expand
+                degrees = self.degrees()
+                from_a = degrees[near_a].sum() <= degrees[near_b].sum()
+                start, start_codes, target, end = (near_a, codes_a, to_b, b) if from_a else (near_b, codes_b, to_a, a)
+                origin = a if from_a else b
+                order = np.argsort(-start_codes, kind="stable")
+                order = order[(start[order] != end) & (start[order] != origin)]
+                for batch in np.array_split(order, max(1, -(-len(order) // PATH_SCAN_BATCH))):
+                    if budget["expansions"] <= 0 or time.perf_counter() > budget["deadline"]:
+                        truncated = True
+                        break
+                    xs = start[batch]
+                    positions = self._positions(xs)
+                    budget["expansions"] -= len(positions)
+                    owners = np.repeat(batch, self.indptr[xs + 1] - self.indptr[xs])
+                    ids, codes = self.indices[positions], self.severity[positions]
+                    hits = (codes >= min_severity) & (target[ids] >= 0) & (ids != start[owners]) & (ids != origin) & (ids != end)
+                    if not hits.any():
+                        continue
+                    owners, ids, codes = owners[hits], ids[hits], codes[hits]
+                    nodes = np.column_stack([np.full(len(ids), origin), start[owners], ids, np.full(len(ids), end)])
+                    edge_codes = np.column_stack([start_codes[owners], codes, target[ids]])
+                    if not from_a:
+                        nodes, edge_codes = nodes[:, ::-1], edge_codes[:, ::-1]
+                    record(nodes, edge_codes)
+
+        paths = [
+            {
+                "path": [self.names[n] for n in nodes],
+                "severities": [SEVERITY_LEVELS[c] for c in codes],
+                "score": round(score, 4)
+            }
+            for score, _, nodes, codes in sorted(found, reverse=True)
+        ]
+        return paths, truncated
+
+    def _positions(self, node_ids: np.ndarray) -> np.ndarray:
+        """CSR entry positions of every neighbor of `node_ids`, grouped by node (one vectorized gather)."""
+        starts = self.indptr[node_ids]
+        lengths = self.indptr[np.asarray(node_ids) + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return np.arange(lengths.sum(), dtype=np.int64) + offsets
+
+    def expand(self, node_ids: np.ndarray, min_severity: int = 0) -> np.ndarray:
+        """Distinct neighbors of `node_ids` over edges of at least `min_severity`."""
+        positions = self._positions(node_ids)
+        if min_severity:
+            positions = positions[self.severity[positions] >= min_severity]
+        return np.unique(self.indices[positions])
+
+    def neighborhood(self, seeds: Iterable[str], hops: int = 1, min_severity: int = 0) -> np.ndarray:
+        """
+        IDs of the seeds and every drug within `hops` of them over edges of at least `min_severity`:
+        nearest hops first, highest degree (over those edges) first within a hop.
+        """
+        degrees = self.degrees(min_severity)
+        frontier = np.array(list(dict.fromkeys(self.index[n] for n in seeds if n in self.index)), dtype=np.int64)
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        visited[frontier] = True
+        layers = [frontier]
+        for _ in range(hops):
+            if not len(frontier):
+                break
+            reached = self.expand(frontier, min_severity)
+            frontier = reached[~visited[reached]]
+            visited[frontier] = True
+            layers.append(frontier[np.argsort(-degrees[frontier], kind="stable")])
+        return np.concatenate(layers)
+
+    def select(self, min_severity: int = 0, seeds: Optional[Iterable[str]] = None, hops: int = 1,
+               max_nodes: Optional[int] = None, max_edges: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Nodes and links for display. With `seeds`, the k-hop neighborhood of those drugs
+        (nearest hops first); otherwise the whole graph. Only edges of at least `min_severity`
+        are followed and returned. Limits keep seeds and the drugs with most such edges, then the most
+        severe edges.
+        """
+        if seeds is not None:
+            order = self.neighborhood(seeds, hops, min_severity)
+        else:
+            degrees = self.degrees(min_severity)
+            candidates = np.flatnonzero(degrees) if min_severity else np.arange(self.num_nodes)
+            order = candidates[np.argsort(-degrees[candidates], kind="stable")]
+
+        truncated = max_nodes is not None and len(order) > max_nodes
+        if truncated:
+            order = order[:max_nodes]
+        member = np.zeros(self.num_nodes, dtype=bool)
+        member[order] = True
+        src, dst, severity = self.edge_arrays()
+        keep = np.flatnonzero(member[src] & member[dst] & (severity >= min_severity))
+        if max_edges is not None and len(keep) > max_edges:
+            keep = keep[np.argsort(-severity[keep].astype(np.int16), kind="stable")[:max_edges]]
+            truncated = True
+
+        return {
+            "nodes": [{"id": self.names[i], "group": 1} for i in order.tolist()],
+            "links": [
+                {"source": self.names[i], "target": self.names[j], "severity": SEVERITY_LEVELS[code]}
+                for i, j, code in zip(src[keep].tolist(), dst[keep].tolist(), severity[keep].tolist())
+            ],
+            "truncated": truncated
+        }
+
+    def subgraph(self, names: Iterable[str]) -> nx.Graph:
+        """networkx graph induced by the given drugs that exist in the graph."""
+        ids = list(dict.fromkeys(self.index[n] for n in names if n in self.index))
+        graph = nx.Graph()
+        graph.add_nodes_from(self.names[i] for i in ids)
+        wanted = np.array(ids, dtype=np.int32)
+        for i in ids:
+            neighbors = self.neighbor_ids(i)
+            hits = np.flatnonzero(np.isin(neighbors, wanted) & (neighbors >= i))
+            severities = self.neighbor_severities(i)
+            for k in hits.tolist():
+                graph.add_edge(self.names[i], self.names[neighbors[k]],
+                               severity=SEVERITY_LEVELS[severities[k]], type="interaction")
+        return graph
+
+    def to_networkx(self) -> nx.Graph:
+        """Full networkx export for algorithms that need it (built once, then cached)."""
+        if self._nx is None:
+            graph = nx.Graph()
+            graph.add_nodes_from(self.names)
+            graph.add_edges_from(
+                (d1, d2, {"severity": label, "type": "interaction"}) for d1, d2, label in self.iter_edges()
+            )
+            self._nx = graph
+        return self._nx
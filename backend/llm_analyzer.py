@@ -9,6 +9,9 @@ class LLMDrugAnalyzer:
     def __init__(self, llm=None):
         self.llm = llm
         self._cache = {}  # Simple cache for faster responses
+        # Interaction results come from the classifier once trained; a new model invalidates them
+        from .interaction_classifier import interaction_classifier
+        interaction_classifier.on_install.append(lambda model: self._cache.clear())
         
     def _get_cache_key(self, drug_a: str, drug_b: str) -> str:
         """Generate cache key for drug pair"""
@@ -34,13 +37,17 @@ class LLMDrugAnalyzer:
         """Fast fallback using region_mapper"""
         # Import here to avoid circular dependency
         from .region_mapper import region_mapper
+        from .interaction_classifier import interaction_classifier
         
         regions_a = region_mapper.get_affected_regions(drug_a)
         regions_b = region_mapper.get_affected_regions(drug_b)
         
-        # Calculate severity based on overlapping regions
+        # Calculate severity from the trained classifier when it predicts an interaction, else from overlapping regions
         common_regions = set(regions_a) & set(regions_b)
-        if len(common_regions) >= 3:
+        prediction = interaction_classifier.predict_pairs([(drug_a, drug_b)])
+        if prediction is not None and prediction[0]["interacts"]:
+            severity = prediction[0]["risk"]
+        elif len(common_regions) >= 3:
             severity = 0.7  # Major
         elif len(common_regions) >= 1:
             severity = 0.5  # Moderate
@@ -1,25 +1,43 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File
+from fastapi import (
+    FastAPI, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File, Query, Request, Header, Depends
+)
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Dict, Any, Optional
 import uvicorn
+import asyncio
+import hmac
 import json
 import random
 
 from .models import (
     InteractionCheckRequest, CheckResponse, InteractionResult,
     ExplainRequest, ExplainResponse,
-    PredictRequest, PredictResponse,
+    PredictRequest, PredictResponse, BatchPredictRequest, BatchPredictResponse, NovelInteractionsResponse,
     AnalyticsResponse, AgentQueryRequest, AgentQueryResponse
 )
 from .graph_builder import drug_graph
+from .graph_analytics import graph_analytics
+from .interaction_graph import SEVERITY_LEVELS, severity_code
 from .rag_pipeline import rag
 from .ml_prediction import predictor
+from .ml_training import EMBEDDING_METHODS
+from .embedding_store import embedding_bytes
+from .interaction_classifier import interaction_classifier
 from .blockchain_audit import audit_log
+from .audit_writer import audit_writer
+from .audit_verifier import audit_verifier
+from .audit_index import audit_index
 from .region_mapper import region_mapper  # NEW - comprehensive region mapping
 from .organ_mapper import organ_mapper  # Keep for legacy compatibility
 from .llm_analyzer import initialize_llm_analyzer, llm_analyzer  # NEW - LLM-based analysis
 from .places_service import places_service  # NEW - Free location services
 from .drug_knowledge import drug_knowledge  # NEW - Fuzzy matching and drug class identification
+from .config import (
+    AUDIT_PAGE_SIZE, AUDIT_PAGE_MAX, AUDIT_PAGE_MAX_RECORDS, GRAPH_MAX_HOPS, GRAPH_WATCH_INTERVAL, ADMIN_TOKEN, DDINTER_PATH,
+    GRAPH_PATH_MAX_DEPTH, GRAPH_PATH_MAX_DRUGS, ML_TRAIN_ON_STARTUP, PREDICT_BATCH_MAX_DRUGS, PREDICT_BATCH_MAX_PAIRS,
+    SIMILAR_MAX_K, EMBEDDING_METHOD
+)
 
 app = FastAPI(
     title="PharmAI Nexus API",
@@ -36,8 +54,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints fail closed: disabled until ADMIN_TOKEN is set, then the X-Admin-Token header must match."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+async def watch_dataset(interval: float):
+    """Reloads the interaction graph once the CSV changes and has stopped changing between two checks."""
+    loop = asyncio.get_running_loop()
+    pending = None
+    while True:
+        await asyncio.sleep(interval)
+        if not drug_graph.source_changed():
+            pending = None
+            continue
+        stat = DDINTER_PATH.stat()
+        seen = (stat.st_size, stat.st_mtime_ns)
+        if seen != pending:
+            pending = seen  # Possibly still being written; check again next time
+            continue
+        try:
+            await loop.run_in_executor(None, drug_graph.reload)
+        except Exception as e:
+            print(f"⚠ Dataset reload failed: {e}")
+        pending = None
+
 @app.on_event("startup")
 async def startup_event():
+    await audit_writer.start()
+    if GRAPH_WATCH_INTERVAL > 0:
+        app.state.dataset_watcher = asyncio.create_task(watch_dataset(GRAPH_WATCH_INTERVAL))
+    if ML_TRAIN_ON_STARTUP and not predictor.is_trained:
+        # Child process in one worker (the rest wait on the training lock and load its result);
+        # predictions report "warming" until then
+        predictor.start_training()
+    # Index whatever was appended while the search index was offline, without delaying startup
+    asyncio.get_running_loop().run_in_executor(None, audit_index.catch_up)
+
     # Initialize LLM analyzer with the LLM from RAG pipeline
     if rag.llm:
         initialize_llm_analyzer(rag.llm)
@@ -45,6 +100,15 @@ async def startup_event():
     else:
         print("⚠ LLM not available, analyzer will use fallback mode")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush queued audit records before the process exits
+    await audit_writer.stop()
+    watcher = getattr(app.state, "dataset_watcher", None)
+    if watcher is not None:
+        watcher.cancel()
+    predictor.trainer.cancel()
+
 @app.post("/analyze_prescription")
 async def analyze_prescription(file: UploadFile = File(...)):
     """
@@ -69,6 +133,9 @@ async def check_interactions(request: InteractionCheckRequest):
     organ_impacts = {}  # Legacy
     region_impacts = {}  # NEW - comprehensive regions
     
+    # Every pair scored by the trained classifier in one call (None until it is trained)
+    classified = iter(interaction_classifier.predict_regimen(drugs) or [])
+    
     # FAST: Use region_mapper directly (no LLM calls)
     for i in range(len(drugs)):
         for j in range(i + 1, len(drugs)):
@@ -80,7 +147,11 @@ async def check_interactions(request: InteractionCheckRequest):
             
             # Calculate severity based on overlapping regions
             common_regions = set(regions_d1) & set(regions_d2)
-            if len(common_regions) >= 3:
+            prediction = next(classified, None)
+            # A pair the classifier sees no interaction for keeps the region-overlap estimate
+            if prediction is not None and prediction["interacts"]:
+                sev_score = prediction["risk"]
+            elif len(common_regions) >= 3:
                 sev_score = 0.8  # Major
             elif len(common_regions) >= 1:
                 sev_score = 0.5  # Moderate
@@ -185,13 +256,14 @@ async def check_interactions(request: InteractionCheckRequest):
             {"drug": "Acetaminophen", "reason": "Lower interaction potential"}
         ]
     
-    # Log to blockchain
+    # Log to blockchain (queued - the background writer batches disk writes)
     log_data = {
         "drugs": drugs,
         "interaction_count": len(drug_interactions),
         "global_risk": global_risk
     }
-    audit_log.add_block(log_data)
+    pending_receipt = audit_writer.submit(log_data)
+    audit_receipt = await pending_receipt if request.wait_for_audit else None
     
     # Calculate bloodflow impacts based on organ risks
     bloodflow_impacts = {}
@@ -207,7 +279,8 @@ async def check_interactions(request: InteractionCheckRequest):
         "bloodflow_impacts": bloodflow_impacts,  # NEW - for blood vessel visualization
         "side_effect_spread": side_effect_spread,
         "global_risk": global_risk,
-        "alternatives": alternatives
+        "alternatives": alternatives,
+        "audit_receipt": audit_receipt
     }
 
 @app.post("/api/agent_query")
@@ -316,23 +389,96 @@ async def explain_interaction(request: ExplainRequest):
 
 @app.post("/api/predict_interaction", response_model=PredictResponse)
 async def predict_interaction(request: PredictRequest):
-    if not predictor.is_trained:
-        predictor.train()
+    predictor.ensure_training()  # Never train inline - answer "warming" until the job finishes
         
     result = predictor.predict(request.drug_a, request.drug_b)
     
     return PredictResponse(
         known_interaction=result["known"],
         predicted_risk_score=result["score"],
-        comment=result["comment"]
+        comment=result["comment"],
+        model_status=predictor.status,
+        training_error=predictor.training_error
+    )
+
+@app.post("/api/predict_interactions_batch", response_model=BatchPredictResponse)
+async def predict_interactions_batch(request: BatchPredictRequest):
+    """Scores every pair of a regimen (`drugs`) and/or explicit `pairs` in one vectorized pass."""
+    if len(request.drugs) > PREDICT_BATCH_MAX_DRUGS:
+        raise HTTPException(status_code=400, detail=f"At most {PREDICT_BATCH_MAX_DRUGS} drugs per regimen")
+    if any(len(pair) != 2 for pair in request.pairs):
+        raise HTTPException(status_code=400, detail="Each pair must name exactly two drugs")
+    if len(request.pairs) > PREDICT_BATCH_MAX_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {PREDICT_BATCH_MAX_PAIRS} pairs per request")
+
+    predictor.ensure_training()  # Never train inline - answer "warming" until the job finishes
+
+    drugs = [d for d in request.drugs if d.strip()]
+    results = predictor.predict_regimen(drugs) if len(drugs) > 1 else []
+    if request.pairs:
+        results += predictor.predict_pairs(request.pairs)
+    return BatchPredictResponse(
+        predictions=[{
+            "drug_a": r["drug_a"],
+            "drug_b": r["drug_b"],
+            "known_interaction": r["known"],
+            "severity": r["severity"],
+            "predicted_risk_score": r["score"],
+            "comment": r["comment"]
+        } for r in results],
+        model_status=predictor.status,
+        model_version=predictor.model_version,
+        training_error=predictor.training_error
+    )
+
+@app.get("/api/predict_novel_interactions", response_model=NovelInteractionsResponse)
+async def predict_novel_interactions(drug: str, k: int = Query(10, ge=1, le=SIMILAR_MAX_K)):
+    """The k drugs with the closest embeddings to `drug` among those not known to interact with it."""
+    predictor.ensure_training()  # Never train inline - answer "warming" until the job finishes
+
+    results = predictor.similar_drugs(drug, k)
+    return NovelInteractionsResponse(
+        drug=drug.strip().lower(),
+        candidates=[{"drug": r["drug"], "predicted_risk_score": r["score"]} for r in results or []],
+        model_status=predictor.status,
+        model_version=predictor.model_version,
+        training_error=predictor.training_error
     )
 
+@app.post("/api/ml/train", dependencies=[Depends(require_admin)])
+async def start_training(full: bool = False, method: Optional[str] = None):
+    """
+    Starts background embedding training (no-op if a job is already running). After a dataset change
+    only the changed neighbourhood is retrained, warm-starting the previous model; full=true refits everything.
+    Embeddings already trained for the current graph are kept unless full=true.
+    method overrides EMBEDDING_METHOD for this job ("node2vec" or "spectral").
+    Admin only (X-Admin-Token), like cancelling: jobs take minutes of CPU.
+    """
+    if method is not None and method not in EMBEDDING_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(EMBEDDING_METHODS)}")
+    return predictor.start_training(full=full, method=method or EMBEDDING_METHOD)
+
+@app.get("/api/ml/status")
+async def training_status():
+    """Model readiness plus the current or last training job: phase, progress, timings, errors."""
+    return {
+        "model_status": predictor.status,
+        "model_version": predictor.model_version,
+        "graph_version": drug_graph.version,
+        "stale_drugs": len(predictor.stale_drugs),
+        "quantized": predictor.store.quantized,
+        "embedding_bytes": embedding_bytes(predictor.embeddings) if predictor.is_trained else 0,
+        "job": predictor.trainer.status(),
+        "classifier": interaction_classifier.status()
+    }
+
+@app.post("/api/ml/train/cancel", dependencies=[Depends(require_admin)])
+async def cancel_training():
+    return predictor.trainer.cancel()
+
 @app.get("/api/analytics/summary", response_model=AnalyticsResponse)
 async def get_analytics():
-    severities = {}
-    for u, v, data in drug_graph.graph.edges(data=True):
-        sev = data.get("severity", "Unknown")
-        severities[sev] = severities.get(sev, 0) + 1
+    stats = graph_analytics.summary()
         
     top_pairs = [
         {"pair": "Warfarin + Aspirin", "count": 120},
@@ -340,26 +486,169 @@ async def get_analytics():
         {"pair": "Simvastatin + Amlodipine", "count": 60},
     ]
     
-    return AnalyticsResponse(
-        top_risky_pairs=top_pairs,
-        severity_distribution=severities
-    )
+    return AnalyticsResponse(top_risky_pairs=top_pairs, **stats)
 
 @app.get("/api/audit/chain")
-async def get_chain():
-    return audit_log.chain
+async def get_chain(
+    cursor: Optional[int] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$")
+):
+    """
+    Reads the audit log in bounded memory.
+    JSON mode returns one page plus next_cursor (null on the last page); a page ends early
+    once it holds AUDIT_PAGE_MAX_RECORDS batched records.
+    format=ndjson streams every matching block, one per line.
+    cursor is a block index; since/until filter by block timestamp (since <= t < until, as in /api/audit/search).
+    """
+    descending = order == "desc"
+
+    def select_blocks():
+        audit_log.refresh()
+        first = audit_log.find_index(since) if since is not None else 0
+        last = (audit_log.find_index(until) if until is not None else len(audit_log.chain)) - 1
+        if cursor is not None:
+            if descending:
+                last = min(last, cursor)
+            else:
+                first = max(first, cursor)
+        return range(last, first - 1, -1) if descending else range(first, last + 1)
+
+    def read_page():
+        page, records = [], 0
+        for block_data in audit_log.iter_blocks(indices[:min(limit or AUDIT_PAGE_SIZE, AUDIT_PAGE_MAX)]):
+            page.append(block_data)
+            records += len(block_data.get("records") or ())
+            if records >= AUDIT_PAGE_MAX_RECORDS:
+                break
+        return page
+
+    # Index searches and block reads hit mmapped segments; keep them off the event loop
+    loop = asyncio.get_running_loop()
+    indices = await loop.run_in_executor(None, select_blocks)
+
+    if fmt == "ndjson":
+        if limit:
+            indices = indices[:limit]
+
+        # A plain generator: StreamingResponse iterates it in the threadpool
+        def stream_blocks():
+            lines = []
+            for block_data in audit_log.iter_blocks(indices):
+                lines.append(json.dumps(block_data) + "\n")
+                if len(lines) >= AUDIT_PAGE_SIZE:
+                    yield "".join(lines)
+                    lines = []
+            if lines:
+                yield "".join(lines)
+
+        return StreamingResponse(stream_blocks(), media_type="application/x-ndjson")
+
+    page = await loop.run_in_executor(None, read_page)
+    has_more = len(indices) > len(page)
+    return {
+        "blocks": page,
+        "next_cursor": indices[len(page) - 1] + (-1 if descending else 1) if has_more else None,
+        "chain_length": len(audit_log.chain)
+    }
+
+@app.get("/api/audit/proof/{block_index}/{position}")
+async def get_inclusion_proof(block_index: int, position: int):
+    """Merkle inclusion proof for one record, checkable without the rest of the chain."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, audit_log.refresh)
+    try:
+        return await loop.run_in_executor(None, audit_log.get_inclusion_proof, block_index, position)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/audit/search")
+async def search_audit(
+    drug: List[str] = Query([]),
+    min_risk: Optional[float] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = Query(AUDIT_PAGE_SIZE, ge=1, le=AUDIT_PAGE_MAX),
+    cursor: Optional[str] = None
+):
+    """
+    Interaction-check records by drug (repeat for several; all must match),
+    global risk above min_risk and timestamp range, newest first.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, audit_log.refresh)
+    await loop.run_in_executor(None, audit_index.catch_up)  # Blocks appended by other workers
+    try:
+        return await loop.run_in_executor(None, audit_index.search, drug, min_risk, since, until, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/api/audit/verify")
+async def verify_chain(full: bool = False):
+    """Verifies blocks added since the last checkpoint, or the whole chain with full=true."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, audit_verifier.verify, full)
 
 @app.get("/api/graph/data")
-async def get_graph_data():
-    nodes = [{"id": n, "group": 1} for n in drug_graph.graph.nodes()]
-    links = []
-    for u, v, data in drug_graph.graph.edges(data=True):
-        links.append({
-            "source": u,
-            "target": v,
-            "severity": data.get("severity", "Unknown")
-        })
-    return {"nodes": nodes, "links": links}
+async def get_graph_data(
+    request: Request,
+    min_severity: str = "Unknown",
+    drug: Optional[List[str]] = Query(None),
+    hops: int = Query(1, ge=0, le=GRAPH_MAX_HOPS),
+    max_nodes: Optional[int] = Query(None, ge=1),
+    max_edges: Optional[int] = Query(None, ge=0)
+):
+    """
+    Interaction graph for visualization. min_severity drops weaker edges (Unknown < Minor < Moderate < Major);
+    drug (repeat for several) limits the graph to their hops-neighborhood; max_nodes/max_edges cap the payload.
+    Responses carry an ETag per graph version and query; If-None-Match returns 304.
+    """
+    if min_severity.strip().lower() not in {level.lower() for level in SEVERITY_LEVELS}:
+        raise HTTPException(status_code=400, detail=f"min_severity must be one of {', '.join(SEVERITY_LEVELS)}")
+    loop = asyncio.get_running_loop()
+    body, etag, version = await loop.run_in_executor(
+        None, drug_graph.graph_payload, severity_code(min_severity), drug, hops, max_nodes, max_edges
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Graph-Version": version}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/graph/paths")
+async def get_interaction_paths(
+    drug: List[str] = Query(...),
+    max_depth: int = Query(GRAPH_PATH_MAX_DEPTH, ge=1, le=GRAPH_PATH_MAX_DEPTH),
+    min_severity: str = "Unknown",
+    limit: int = Query(10, ge=1, le=100)
+):
+    """
+    Direct and indirect interaction chains between every pair of drugs in a regimen (repeat drug),
+    up to max_depth edges, ranked by edge severity. Results are marked truncated when the search budget runs out.
+    """
+    if not 2 <= len(drug) <= GRAPH_PATH_MAX_DRUGS:
+        raise HTTPException(status_code=400, detail=f"Provide between 2 and {GRAPH_PATH_MAX_DRUGS} drugs")
+    if min_severity.strip().lower() not in {level.lower() for level in SEVERITY_LEVELS}:
+        raise HTTPException(status_code=400, detail=f"min_severity must be one of {', '.join(SEVERITY_LEVELS)}")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, lambda: drug_graph.find_paths(drug, max_depth, severity_code(min_severity), limit)
+    )
+
+@app.post("/api/admin/graph/reload", dependencies=[Depends(require_admin)])
+async def reload_graph():
+    """Re-reads ddinter.csv and applies only the changed interactions, without a restart."""
+    if not DDINTER_PATH.exists():
+        raise HTTPException(status_code=404, detail="No interaction dataset found")
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, drug_graph.reload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
 
 if __name__ == "__main__":
     uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,56 @@
+"""
+Merkle tree helpers for batched audit blocks
+Leaves and inner nodes are hashed with different prefixes so a leaf can never pass as a subtree
+"""
+import hashlib
+import json
+from typing import Any, Dict, List
+
+EMPTY_ROOT = hashlib.sha256(b"").hexdigest()
+
+
+def leaf_hash(record: Dict[str, Any]) -> str:
+    return hashlib.sha256(b"\x00" + json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+
+def _node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def merkle_levels(leaves: List[str]) -> List[List[str]]:
+    """All tree levels, leaves first. An unpaired node is promoted to the next level unchanged."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(leaves: List[str]) -> str:
+    if not leaves:
+        return EMPTY_ROOT
+    return merkle_levels(leaves)[-1][0]
+
+
+def merkle_proof(leaves: List[str], position: int) -> List[Dict[str, str]]:
+    """Sibling hashes from leaf to root - O(log n) entries."""
+    if not 0 <= position < len(leaves):
+        raise IndexError(f"Leaf {position} out of range for {len(leaves)} leaves")
+    proof = []
+    for level in merkle_levels(leaves)[:-1]:
+        sibling = position ^ 1
+        if sibling < len(level):
+            proof.append({"hash": level[sibling], "side": "left" if sibling < position else "right"})
+        position //= 2
+    return proof
+
+
+def verify_proof(leaf: str, proof: List[Dict[str, str]], root: str) -> bool:
+    """Recomputes the root from a leaf hash and its proof."""
+    node = leaf
+    for step in proof:
+        node = _node_hash(step["hash"], node) if step["side"] == "left" else _node_hash(node, step["hash"])
+    return node == root
@@ -1,88 +1,324 @@
-import networkx as nx
-from node2vec import Node2Vec
-from sklearn.metrics.pairwise import cosine_similarity
+import functools
+import threading
+import time
 import numpy as np
+from .config import (
+    ANN_EXACT_MAX_VOCAB, EMBEDDING_AUTO_UPDATE, EMBEDDING_METHOD, TRAINING_RETRY_COOLDOWN
+)
 from .graph_builder import drug_graph
-from .config import EMBEDDING_DIM, WALK_LENGTH, NUM_WALKS, WORKERS
+from .interaction_graph import SEVERITY_LEVELS
+from .embedding_index import LSHIndex
+from .embedding_store import (
+    EmbeddingSet, embedding_store, make_embedding_set, normalize_rows, quantize_rows, similarities, unit_rows
+)
+from .ml_training import TrainingManager, classifier_for, fit_embeddings, update_region
 
 class InteractionPredictor:
-    def __init__(self):
-        self.graph = drug_graph.graph
+    def __init__(self, store=embedding_store, graph_source=drug_graph):
         self.model = None
-        self.embeddings = {}
-        self.is_trained = False
+        self.store = store
+        self.graph_source = graph_source  # Anything with the current .csr and .version, normally the GraphBuilder
+        self.embeddings: EmbeddingSet = None  # Swapped as a whole; arrays may be read-only memmaps, unit may be int8
+        self.stale_drugs = set()  # Drugs whose interactions changed since the embeddings were trained
+        self.trainer = TrainingManager()
+        self.trainer.on_finish.append(self._after_job)
+        self._update_pending = False  # A reload arrived while a job was running
+        self._next_store_check = 0.0
+        self.on_install = []  # Called with each embedding set swapped in (trained or loaded)
+        # Derived from the current embeddings (and graph); rebuilt lazily when either is swapped
+        self._lock = threading.Lock()
+        self._ann = (None, None)  # (embeddings, LSHIndex or None for an exact scan)
+        self._graph_rows = (None, None, None)  # (csr, embeddings, embedding row per graph node ID)
+        self.load_stored()
 
-    def train(self):
-        """Trains Node2Vec model on the current graph."""
-        if len(self.graph.nodes) < 5:
-            print("Graph too small for meaningful training. Skipping.")
+    @property
+    def is_trained(self):
+        return self.embeddings is not None
+
+    @property
+    def model_version(self):
+        """Graph version the embeddings were trained on."""
+        return self.embeddings.version if self.embeddings is not None else None
+
+    @property
+    def graph(self):
+        # networkx view for callers that need one; built on first use, not at import
+        return self.graph_source.graph
+
+    @property
+    def status(self):
+        if self.is_trained:
+            return "ready"
+        return "warming" if self.trainer.running else "untrained"
+
+    @property
+    def training_error(self):
+        """Error of the last training job if it failed, else None."""
+        status = self.trainer.status()
+        return status.get("error") if status["state"] == "failed" else None
+
+    def ensure_training(self):
+        """
+        Auto-start for prediction requests: trains when no job was ever started, or when the last one
+        failed or was cancelled at least TRAINING_RETRY_COOLDOWN seconds ago - never on every request.
+        """
+        if self.is_trained:
+            return
+        status = self.trainer.status()
+        if status["state"] == "idle" or (status["state"] in ("failed", "cancelled")
+                                         and time.time() - status["finished_at"] >= TRAINING_RETRY_COOLDOWN):
+            self.start_training()
+
+    def on_graph_change(self, csr, delta):
+        """
+        Embeddings survive a dataset reload; drugs the delta touched are marked stale, and with
+        EMBEDDING_AUTO_UPDATE a background job retrains just their neighbourhood - right away, or
+        after the job already running has installed its (then outdated) embeddings. Every worker's
+        watcher sees the reload, but only the one holding the training lock trains; the rest load its result.
+        """
+        self.stale_drugs.update(delta.touched if delta is not None else csr.names)
+        if not EMBEDDING_AUTO_UPDATE:
             return
+        if self.trainer.running:
+            self._update_pending = True  # The job trains the old graph; catch up once it is installed
+        elif delta is not None and self.is_trained:
+            self.start_training()
+
+    def _after_job(self, status):
+        if self._update_pending and status["state"] == "completed" and self.model_version != self.graph_source.version:
+            self._update_pending = False
+            self.start_training()
 
-        print("Training Node2Vec model...")
-        # Precompute probabilities and generate walks
-        node2vec = Node2Vec(
-            self.graph, 
-            dimensions=EMBEDDING_DIM, 
-            walk_length=WALK_LENGTH, 
-            num_walks=NUM_WALKS, 
-            workers=WORKERS,
-            quiet=True
+    def load_stored(self) -> bool:
+        """Maps embeddings already trained for the current graph (by this or another worker)."""
+        embeddings = self.store.load(self.graph_source.version)
+        if embeddings is None:
+            return False
+        self.embeddings = embeddings
+        self.stale_drugs.clear()
+        self._search_structures(embeddings)  # Build the ANN index now rather than on the first query
+        print(f"✓ Loaded stored embeddings for {len(embeddings.vocab)} drugs (graph {embeddings.version})")
+        self._notify(embeddings)
+        return True
+
+    def start_training(self, full=False, method=EMBEDDING_METHOD):
+        """
+        Starts embedding training in a background process; returns the job status. Embeddings already
+        trained (or stored) for the current graph are kept unless `full` is set. When the current
+        Node2Vec embeddings are for an older graph, the job warm-starts from them unless `full` is set.
+        While another worker trains, the job waits for it and loads its embeddings from the store.
+        """
+        if self.graph_source.csr.num_nodes < 5:
+            return {"state": "skipped", "error": "Graph too small for meaningful training"}
+        if self.model_version == self.graph_source.version and not full:
+            return {"state": "ready", "graph_version": self.graph_source.version}
+        if self.model_version != self.graph_source.version and self.load_stored():
+            return {"state": "loaded", "graph_version": self.graph_source.version}
+        base = None if full or method != "node2vec" else self._update_base()
+        model_path = self.store.scratch_path() if method == "node2vec" else None
+        return self.trainer.start(
+            self.graph_source.csr, self.graph_source.version,
+            functools.partial(self.install, model_file=model_path, method=method),
+            model_path=str(model_path) if model_path else None, base=base, method=method,
+            on_elsewhere=self.load_stored, reuse_stored=None if full else self.load_stored
         )
-        
-        # Embed nodes
-        self.model = node2vec.fit(window=10, min_count=1, batch_words=4)
-        
-        # Store embeddings in memory
-        for node in self.graph.nodes():
-            if node in self.model.wv:
-                self.embeddings[node] = self.model.wv[node]
-                
-        self.is_trained = True
-        print("Node2Vec training complete.")
+
+    def _update_base(self):
+        """Warm-start input for an incremental job, or None when a full fit is needed."""
+        embeddings, csr = self.embeddings, self.graph_source.csr
+        if embeddings is None or embeddings.version == self.graph_source.version or not self.stale_drugs:
+            return None
+        model_path = self.store.model_path(embeddings.version)
+        if model_path is None:
+            return None  # Trained before models were kept
+        touched = sorted(self.stale_drugs)
+        seeds = np.array([csr.index[name] for name in touched if name in csr.index], dtype=np.int64)
+        if update_region(csr, seeds) is None:
+            return None  # Most of the graph changed - a fresh fit costs about the same
+        return {"model_path": str(model_path), "vocab": list(embeddings.vocab), "touched": touched}
+
+    def install(self, vocab, vectors, graph_version, model_file=None, method=EMBEDDING_METHOD, classifier=None):
+        """
+        Persists freshly trained embeddings (and the classifier fitted with them) and swaps them in.
+        Readers see the old or the new set, never a mix.
+        """
+        try:
+            self.store.save(graph_version, vocab, vectors, model_file=model_file, classifier=classifier,
+                            method=method)
+            stored = self.store.load(graph_version)
+        except OSError as e:
+            print(f"⚠ Could not persist embeddings: {e}")
+            stored = None
+        if stored is None:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            packed = quantize_rows(normalize_rows(vectors)) if self.store.quantized else None
+            stored = make_embedding_set(vocab, vectors, graph_version, packed=packed, classifier=classifier)
+        self.embeddings = stored
+        if graph_version == self.graph_source.version:
+            self.stale_drugs.clear()
+        self._search_structures(self.embeddings)
+        print(f"✓ {'Spectral' if method == 'spectral' else 'Node2Vec'} embeddings ready ({len(vocab)} drugs)")
+        self._notify(self.embeddings)
+
+    def _notify(self, embeddings):
+        for listener in self.on_install:
+            try:
+                listener(embeddings)
+            except Exception as e:
+                print(f"⚠ Embedding install listener failed: {e}")
+
+    def train(self, method=EMBEDDING_METHOD):
+        """Trains embeddings on the current graph in this process (blocks until done)."""
+        if self.graph_source.csr.num_nodes < 5:
+            print("Graph too small for meaningful training. Skipping.")
+            return
+
+        print(f"Training {method} embeddings...")
+        csr, version = self.graph_source.csr, self.graph_source.version
+        src, dst, severity = csr.edge_arrays()
+        model_path = self.store.scratch_path() if method == "node2vec" else None
+        vocab, vectors = fit_embeddings(method, csr.names, src, dst, severity,
+                                        model_path=str(model_path) if model_path else None)
+        classifier = classifier_for(csr.names, src, dst, severity, vocab, vectors)
+        self.install(vocab, vectors, version, model_file=model_path, method=method, classifier=classifier)
+
+    def _pick_up_stored(self):
+        # A sibling worker may have finished training; checking the store is a stat call, at most once a second
+        if time.monotonic() >= self._next_store_check:
+            self._next_store_check = time.monotonic() + 1.0
+            self.load_stored()
 
     def predict(self, drug_a, drug_b):
         """Predicts interaction probability between two drugs."""
-        d1 = drug_a.strip().lower()
-        d2 = drug_b.strip().lower()
-        
-        # If known interaction
-        if self.graph.has_edge(d1, d2):
-            return {
-                "known": True,
-                "score": 1.0,
-                "comment": "Known interaction found in database."
-            }
-            
-        # If not trained or nodes missing
-        if not self.is_trained or d1 not in self.embeddings or d2 not in self.embeddings:
-            return {
-                "known": False,
-                "score": 0.0,
-                "comment": "Insufficient data for prediction."
-            }
-            
-        # Calculate cosine similarity
-        vec1 = self.embeddings[d1].reshape(1, -1)
-        vec2 = self.embeddings[d2].reshape(1, -1)
-        similarity = cosine_similarity(vec1, vec2)[0][0]
-        
-        # Normalize -1 to 1 -> 0 to 1 (roughly)
-        score = (similarity + 1) / 2
-        
-        comment = "Low risk predicted."
-        if score > 0.7:
-            comment = "High similarity to interacting pairs. Potential risk."
-        elif score > 0.4:
-            comment = "Moderate similarity. Monitor closely."
-            
-        return {
-            "known": False,
-            "score": float(score),
-            "comment": comment
-        }
+        result = self.predict_pairs([(drug_a, drug_b)])[0]
+        return {"known": result["known"], "score": result["score"], "comment": result["comment"]}
+
+    def predict_pairs(self, pairs):
+        """Scores many (drug_a, drug_b) pairs at once. Each distinct drug is resolved once."""
+        flat = [name for pair in pairs for name in pair]
+        position = {name: i for i, name in enumerate(dict.fromkeys(flat))}
+        ends = np.array([position[name] for name in flat], dtype=np.int64).reshape(-1, 2)
+        return self._score([name.strip().lower() for name in position], ends[:, 0], ends[:, 1])
+
+    def predict_regimen(self, drugs):
+        """Scores every pair of a regimen; the pairs are the upper triangle of its similarity matrix."""
+        names = list(dict.fromkeys(name.strip().lower() for name in drugs))
+        first, second = np.triu_indices(len(names), k=1)
+        return self._score(names, first, second)
+
+    def _score(self, names, first, second):
+        """
+        Scores the pairs (names[first[k]], names[second[k]]). Known interactions come from the graph;
+        the rest are cosine similarities of unit embeddings, computed for the whole batch at once.
+        """
+        # Known interactions, looked up in one vectorized pass over the CSR
+        csr = self.graph_source.csr
+        graph_ids = np.array([csr.index.get(name, -1) for name in names], dtype=np.int64)
+        codes = np.full(len(first), -1, dtype=np.int16)
+        in_graph = (graph_ids[first] >= 0) & (graph_ids[second] >= 0)
+        if in_graph.any():
+            codes[in_graph] = csr.edge_severities(graph_ids[first[in_graph]], graph_ids[second[in_graph]])
+        known = codes >= 0
+
+        scores = np.where(known, 1.0, 0.0)
+        scored = np.zeros(len(first), dtype=bool)
+        if not known.all() and not self.is_trained:
+            self._pick_up_stored()
+        embeddings = self.embeddings
+        if embeddings is not None:
+            rows = np.array([embeddings.index.get(name, -1) for name in names], dtype=np.int64)
+            # If nodes missing, the pair keeps a zero score
+            scored = ~known & (rows[first] >= 0) & (rows[second] >= 0)
+            if scored.any():
+                unit = unit_rows(embeddings, np.maximum(rows, 0))  # One gather (and decode) per distinct drug
+                if len(names) ** 2 <= 4 * len(first):
+                    # Dense batch (a regimen): one Gram matrix product, then read the pairs off it
+                    similarity = (unit @ unit.T)[first[scored], second[scored]]
+                else:
+                    similarity = np.einsum("ij,ij->i", unit[first[scored]], unit[second[scored]])
+                # Normalize -1 to 1 -> 0 to 1 (roughly)
+                scores[scored] = (np.clip(similarity, -1.0, 1.0) + 1) / 2
+
+        if embeddings is None:
+            # Model still training in the background
+            error = self.training_error
+            if self.trainer.running:
+                unscored = "Prediction model is warming up. Try again shortly."
+            elif error:
+                unscored = f"Prediction model training failed: {error}"
+            else:
+                unscored = "Prediction model is not trained yet."
+        else:
+            unscored = "Insufficient data for prediction."
+        comments = np.select(
+            [known, ~scored, scores > 0.7, scores > 0.4],
+            ["Known interaction found in database.", unscored,
+             "High similarity to interacting pairs. Potential risk.", "Moderate similarity. Monitor closely."],
+            "Low risk predicted."
+        )
+        return [
+            {"drug_a": names[a], "drug_b": names[b], "known": k,
+             "severity": SEVERITY_LEVELS[code] if k else None, "score": score, "comment": comment}
+            for a, b, k, code, score, comment in zip(
+                first.tolist(), second.tolist(), known.tolist(), codes.tolist(), scores.tolist(), comments.tolist()
+            )
+        ]
+
+    def _search_structures(self, embeddings):
+        csr = self.graph_source.csr
+        with self._lock:
+            if self._ann[0] is not embeddings:
+                index = LSHIndex(unit_rows(embeddings)) if len(embeddings.vocab) > ANN_EXACT_MAX_VOCAB else None
+                self._ann = (embeddings, index)
+            if self._graph_rows[0] is not csr or self._graph_rows[1] is not embeddings:
+                rows = np.array([embeddings.index.get(name, -1) for name in csr.names], dtype=np.int64)
+                self._graph_rows = (csr, embeddings, rows)
+            return self._ann[1], csr, self._graph_rows[2]
+
+    def similar_drugs(self, drug, k=10):
+        """
+        The k drugs most likely to interact with `drug` that are not already known to: the nearest
+        embeddings by cosine similarity, via the LSH index on large vocabularies. None if untrained.
+        """
+        if not self.is_trained:
+            self._pick_up_stored()
+        embeddings = self.embeddings
+        if embeddings is None:
+            return None
+        name = drug.strip().lower()
+        row = embeddings.index.get(name)
+        if row is None or k <= 0:
+            return []
+        index, csr, graph_rows = self._search_structures(embeddings)
+        excluded = [row]
+        if name in csr.index:
+            excluded.extend(graph_rows[csr.neighbor_ids(csr.index[name])].tolist())
+
+        query = unit_rows(embeddings, np.array([row]))[0]
+        candidates = None
+        if index is not None:
+            candidates = index.candidates(query)
+            candidates = candidates[~np.isin(candidates, excluded)]
+            if len(candidates) < k:
+                candidates = None  # Sparse neighbourhood - fall back to scanning everything
+        if candidates is None:
+            keep = np.ones(len(embeddings.vocab), dtype=bool)
+            keep[[r for r in excluded if r >= 0]] = False
+            candidates = np.flatnonzero(keep)
+            similarity = similarities(embeddings, query)[candidates]
+        else:
+            similarity = similarities(embeddings, query, candidates)
+
+        if len(candidates) > k:
+            top = np.argpartition(-similarity, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        scores = (np.clip(similarity[top], -1.0, 1.0) + 1) / 2
+        return [{"drug": embeddings.vocab[r], "score": score}
+                for r, score in zip(candidates[top].tolist(), scores.tolist())]
 
 # Singleton
 predictor = InteractionPredictor()
-# Optional: Train on startup? 
-# For a hackathon demo, maybe train on first request or background task.
-# We'll trigger it manually or let the app trigger it.
+drug_graph.on_change.append(predictor.on_graph_change)
+# Training runs in the background: started at app startup (ML_TRAIN_ON_STARTUP) or via /api/ml/train
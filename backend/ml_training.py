@@ -0,0 +1,386 @@
+"""
+Background embedding training (Node2Vec, or the spectral backend)
+Each job trains in a child process so a long fit never blocks the event loop; a monitor thread
+collects progress and hands the finished embeddings to a callback that swaps them in.
+After a graph change, a job can instead warm-start the saved Word2Vec model on the changed region.
+The same child then fits the interaction classifier on the new embeddings, so web workers never do.
+"""
+import multiprocessing as mp
+import os
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    EMBEDDING_DIM, WALK_LENGTH, NUM_WALKS, WORKERS, WALK_P, WALK_Q, EMBEDDING_UPDATE_HOPS,
+    EMBEDDING_UPDATE_MAX_FRACTION, EMBEDDING_METHOD, SPECTRAL_SOLVER, TRAINING_LOCK_PATH
+)
+from .embedding_store import make_embedding_set
+from .file_lock import lock_file, try_lock_file, unlock_file
+from .interaction_graph import InteractionGraph
+from .random_walks import write_walk_corpus
+from .spectral_embedding import spectral_embeddings
+
+EMBEDDING_METHODS = ("node2vec", "spectral")
+
+ProgressCallback = Callable[[str, float], None]
+
+
+def _epoch_progress(progress: ProgressCallback):
+    from gensim.models.callbacks import CallbackAny2Vec
+
+    class EpochProgress(CallbackAny2Vec):
+        def __init__(self):
+            self.epoch = 0
+
+        def on_epoch_end(self, model):
+            self.epoch += 1
+            progress("training word2vec", 0.5 + 0.5 * self.epoch / model.epochs)
+
+    return EpochProgress()
+
+
+def _embeddings_by_token(model, token_names: List[str]) -> Tuple[List[str], np.ndarray]:
+    """
+    Vocabulary and vectors ordered by token. Tokens are dense integers (drug names may contain spaces),
+    so position i of a stored vocabulary is token i - which is what an incremental update relies on.
+    """
+    tokens = sorted(int(token) for token in model.wv.index_to_key)
+    if not tokens:
+        return [], np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    rows = [model.wv.key_to_index[str(token)] for token in tokens]
+    return [token_names[token] for token in tokens], model.wv.vectors[rows].astype(np.float32)
+
+
+def _save_model(model, model_path: Optional[str]):
+    if model_path:
+        model.wv.vectors_lockf = np.ones(1, dtype=np.float32)  # The default: every vector trainable
+        model.save(model_path, separately=[])  # One file, moved into the embedding store as-is
+
+
+def train_embeddings(names: List[str], src: np.ndarray, dst: np.ndarray, severity: np.ndarray,
+                     progress: Optional[ProgressCallback] = None, model_path: Optional[str] = None,
+                     num_walks: int = NUM_WALKS) -> Tuple[List[str], np.ndarray]:
+    """
+    Fits Node2Vec on the given edge list. Returns the vocabulary and a float32 (len(vocab), dim) matrix.
+    With `model_path`, the Word2Vec model is saved there so later graph changes can warm-start from it.
+    """
+    from gensim.models import Word2Vec
+
+    progress = progress or (lambda phase, fraction: None)
+    progress("building graph", 0.0)
+    csr = InteractionGraph(names, src, dst, severity)
+    with tempfile.TemporaryDirectory(prefix="node2vec-") as tmp:
+        # Walks stream to disk; Word2Vec reads them back in corpus_file mode, one shard per thread
+        corpus = write_walk_corpus(
+            csr.indptr, csr.indices, Path(tmp) / "walks.txt", num_walks, WALK_LENGTH, WALK_P, WALK_Q,
+            workers=WORKERS, progress=lambda fraction: progress("generating walks", 0.05 + 0.45 * fraction)
+        )
+        progress("training word2vec", 0.5)
+        model = Word2Vec(
+            corpus_file=str(corpus), vector_size=EMBEDDING_DIM, window=10, min_count=1, sg=1,
+            workers=WORKERS, callbacks=[_epoch_progress(progress)]
+        )
+    vocab, vectors = _embeddings_by_token(model, csr.names)
+    _save_model(model, model_path)
+    return vocab, vectors
+
+
+def update_region(csr: InteractionGraph, seeds: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Drugs an incremental update retrains: the seeds plus up to EMBEDDING_UPDATE_HOPS hops around them,
+    stopping before the hop that would take more than EMBEDDING_UPDATE_MAX_FRACTION of the graph
+    (on dense graphs two hops reach most drugs). None if the seeds alone are past that limit.
+    """
+    limit = EMBEDDING_UPDATE_MAX_FRACTION * csr.num_nodes
+    region = np.unique(np.asarray(seeds, dtype=np.int64))
+    if len(region) > limit:
+        return None
+    for _ in range(EMBEDDING_UPDATE_HOPS):
+        wider = np.union1d(region, csr.expand(region)) if len(region) else region
+        if len(wider) > limit:
+            break
+        region = wider
+    return region
+
+
+def update_embeddings(base_model_path: str, base_vocab: List[str], names: List[str], src: np.ndarray,
+                      dst: np.ndarray, severity: np.ndarray, touched: List[str],
+                      progress: Optional[ProgressCallback] = None,
+                      model_path: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Warm-starts from a saved model after a graph change. Walks start only from the update_region of
+    the `touched` drugs, and only those drugs' vectors (plus new drugs') are trainable, so every
+    other embedding stays exactly as it was.
+    Drugs that left the graph keep their old vectors; Word2Vec cannot drop vocabulary.
+    """
+    from gensim.models import Word2Vec
+
+    progress = progress or (lambda phase, fraction: None)
+    progress("building graph", 0.0)
+    csr = InteractionGraph(names, src, dst, severity)
+    model = Word2Vec.load(base_model_path)
+
+    seeds = np.array(sorted({csr.index[name] for name in touched if name in csr.index}), dtype=np.int64)
+    region = update_region(csr, seeds)
+    if region is None:
+        region = seeds  # Callers fall back to a full fit in this case; honour the request anyway
+
+    # Known drugs keep their token; new drugs in the region get the next free ones
+    token_names = list(base_vocab)
+    token_of = {name: token for token, name in enumerate(token_names)}
+    tokens = np.full(csr.num_nodes, -1, dtype=np.int64)  # -1: new drug outside the region, never written
+    for node in range(csr.num_nodes):
+        tokens[node] = token_of.get(csr.names[node], -1)
+    for node in region.tolist():
+        if tokens[node] < 0:
+            tokens[node] = len(token_names)
+            token_names.append(csr.names[node])
+
+    if len(region):
+        with tempfile.TemporaryDirectory(prefix="node2vec-") as tmp:
+            corpus = write_walk_corpus(
+                csr.indptr, csr.indices, Path(tmp) / "walks.txt", NUM_WALKS, WALK_LENGTH, WALK_P, WALK_Q,
+                workers=WORKERS, starts=region, tokens=tokens,
+                progress=lambda fraction: progress("generating walks", 0.05 + 0.45 * fraction)
+            )
+            progress("training word2vec", 0.5)
+            model.build_vocab(corpus_file=str(corpus), update=True)
+            # Freeze every input vector outside the region (0.0 suppresses the update)
+            lockf = np.zeros(len(model.wv), dtype=np.float32)
+            lockf[[model.wv.key_to_index[str(token)] for token in tokens[region].tolist()]] = 1.0
+            model.wv.vectors_lockf = lockf
+            model.train(
+                corpus_file=str(corpus), total_words=model.corpus_total_words, epochs=model.epochs,
+                callbacks=[_epoch_progress(progress)]
+            )
+    vocab, vectors = _embeddings_by_token(model, token_names)
+    _save_model(model, model_path)
+    return vocab, vectors
+
+
+def fit_embeddings(method: str, names: List[str], src: np.ndarray, dst: np.ndarray, severity: np.ndarray,
+                   progress: Optional[ProgressCallback] = None, model_path: Optional[str] = None,
+                   num_walks: int = NUM_WALKS) -> Tuple[List[str], np.ndarray]:
+    """
+    A from-scratch fit with the chosen backend: "node2vec" (walks + Word2Vec, saved to `model_path`)
+    or "spectral" (truncated eigendecomposition; no model to save, so no incremental updates).
+    """
+    if method == "spectral":
+        return spectral_embeddings(names, src, dst, severity, solver=SPECTRAL_SOLVER, progress=progress)
+    if method == "node2vec":
+        return train_embeddings(names, src, dst, severity, progress, model_path, num_walks)
+    raise ValueError(f"Unknown embedding method {method!r}; expected one of {', '.join(EMBEDDING_METHODS)}")
+
+
+def classifier_for(names: List[str], src: np.ndarray, dst: np.ndarray, severity: np.ndarray,
+                   vocab: List[str], vectors: np.ndarray) -> Optional[Dict[str, Any]]:
+    """Interaction classifier coefficients for freshly trained embeddings; None if it cannot be fitted."""
+    from .classifier_training import fit_classifier
+
+    try:
+        return fit_classifier(InteractionGraph(names, src, dst, severity), make_embedding_set(vocab, vectors, ""))
+    except Exception as e:
+        # The embeddings are still worth installing; predictions fall back to the region heuristic
+        print(f"⚠ Interaction classifier training failed: {e}")
+        return None
+
+
+def _training_process(conn, method, names, src, dst, severity, model_path, base):
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()  # Own process group, so cancel() reaches the walk workers too
+    try:
+        send = lambda phase, fraction: conn.send(("progress", phase, fraction))
+        embedding_progress = lambda phase, fraction: send(phase, 0.95 * fraction)
+        if base is None:
+            vocab, vectors = fit_embeddings(method, names, src, dst, severity, embedding_progress, model_path)
+        else:
+            vocab, vectors = update_embeddings(
+                base["model_path"], base["vocab"], names, src, dst, severity, base["touched"],
+                embedding_progress, model_path
+            )
+        send("training classifier", 0.95)
+        conn.send(("done", vocab, vectors, classifier_for(names, src, dst, severity, vocab, vectors)))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def _kill_job(process: mp.Process):
+    """Stops a job and the walk workers it started (they share its process group on POSIX)."""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        # Windows, or the job has not reached setpgrp yet (so it has started no workers either)
+        process.terminate()
+
+
+class TrainingManager:
+    """
+    Runs at most one training job at a time and reports its status. The job holds a lock file, so
+    across uvicorn workers only one trains; the others wait for it and load its result instead.
+    """
+
+    def __init__(self, lock_path: Path = TRAINING_LOCK_PATH):
+        self.lock_path = Path(lock_path)
+        self._lock = threading.Lock()
+        self._process: Optional[mp.Process] = None
+        self._job_lock = None  # Open lock file held for the running job
+        self._status: Dict[str, Any] = {"state": "idle"}
+        self.on_finish = []  # Called with the final status after each job that was not cancelled
+
+    @property
+    def running(self) -> bool:
+        return self._status["state"] == "running"
+
+    def status(self) -> Dict[str, Any]:
+        status = dict(self._status)
+        if status.get("started_at"):
+            status["elapsed_s"] = round((status.get("finished_at") or time.time()) - status["started_at"], 2)
+        return status
+
+    def start(self, csr: InteractionGraph, graph_version: str,
+              on_done: Callable[..., None], model_path: Optional[str] = None,
+              base: Optional[Dict[str, Any]] = None, method: str = EMBEDDING_METHOD,
+              on_elsewhere: Optional[Callable[[], bool]] = None,
+              reuse_stored: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        """
+        Starts training on a copy of `csr` unless a job is already running. Returns the job status.
+        With `base` ({"model_path", "vocab", "touched"}) the job warm-starts that Node2Vec model instead
+        of fitting from scratch. The child saves its Word2Vec model to `model_path` if given.
+        `on_done(vocab, vectors, graph_version, classifier=...)` installs the result.
+        If another worker is training, this job waits for it and then calls `on_elsewhere`, which
+        loads that worker's result and returns whether there was one. `reuse_stored` is the same check
+        once the lock is ours: a worker that finished just before may already have trained this graph.
+        """
+        with self._lock:
+            if self.running:
+                return self.status()
+            job_lock = open(self.lock_path, 'a+b')
+            if not try_lock_file(job_lock):
+                job_lock.close()
+                self._status = {
+                    "state": "running", "job_id": uuid.uuid4().hex[:12], "phase": "waiting for another worker",
+                    "progress": 0.0, "method": method, "mode": "elsewhere", "graph_version": graph_version,
+                    "started_at": time.time(), "finished_at": None, "error": None
+                }
+                threading.Thread(
+                    target=self._wait_elsewhere, args=(self._status["job_id"], on_elsewhere or (lambda: False)),
+                    daemon=True
+                ).start()
+                return self.status()
+            if reuse_stored is not None and reuse_stored():
+                unlock_file(job_lock)
+                job_lock.close()
+                return {"state": "loaded", "graph_version": graph_version}
+            self._job_lock = job_lock
+            src, dst, severity = csr.edge_arrays()
+            # Spawned, not forked: the child must not inherit the server's threads and sockets
+            parent_conn, child_conn = mp.get_context("spawn").Pipe(duplex=False)
+            # Not a daemon: daemonic processes cannot start the walk workers.
+            # Shutdown cancels the job, and an orphaned job exits when its pipe is gone.
+            process = mp.get_context("spawn").Process(
+                target=_training_process, args=(child_conn, method, csr.names, src, dst, severity, model_path, base)
+            )
+            self._status = {
+                "state": "running", "job_id": uuid.uuid4().hex[:12], "phase": "starting", "progress": 0.0,
+                "method": method, "mode": "full" if base is None else "incremental", "graph_version": graph_version,
+                "started_at": time.time(), "finished_at": None, "error": None
+            }
+            if base is not None:
+                self._status["touched_drugs"] = len(base["touched"])
+            process.start()
+            child_conn.close()
+            self._process = process
+            threading.Thread(
+                target=self._monitor, args=(process, parent_conn, self._status["job_id"], graph_version, on_done),
+                daemon=True
+            ).start()
+            return self.status()
+
+    def cancel(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.running:
+                if self._process is not None:
+                    _kill_job(self._process)
+                self._finish("cancelled")
+            return self.status()
+
+    def _wait_elsewhere(self, job_id: str, on_elsewhere: Callable[[], bool]):
+        with open(self.lock_path, 'a+b') as f:
+            lock_file(f)  # Returns once the training worker has installed its result and let go
+            unlock_file(f)
+        with self._lock:
+            if self._status.get("job_id") != job_id or not self.running:
+                return  # Cancelled meanwhile
+        try:
+            loaded, error = on_elsewhere(), "The other worker's job left no embeddings for this graph"
+        except Exception as e:
+            loaded, error = False, f"Loading the other worker's embeddings failed: {e}"
+        self._complete(job_id, None if loaded else error)
+
+    def _monitor(self, process: mp.Process, conn, job_id: str, graph_version: str, on_done: Callable[..., None]):
+        result, error = None, None
+        try:
+            while result is None and error is None:
+                if not conn.poll(0.5):
+                    if not process.is_alive() and not conn.poll():
+                        error = f"Training process exited with code {process.exitcode}"
+                    continue
+                message = conn.recv()
+                if message[0] == "progress":
+                    with self._lock:
+                        if self._status.get("job_id") == job_id and self.running:
+                            self._status.update(phase=message[1], progress=round(message[2], 3))
+                elif message[0] == "done":
+                    result = message[1], message[2], message[3]
+                else:
+                    error = message[1]
+        except (EOFError, OSError):
+            error = error or "Training process ended unexpectedly"
+        finally:
+            conn.close()
+            process.join(timeout=5)
+
+        with self._lock:
+            if self._status.get("job_id") != job_id or not self.running:
+                return  # Cancelled meanwhile
+        if result is not None:
+            try:
+                on_done(result[0], result[1], graph_version, classifier=result[2])
+            except Exception as e:
+                error = f"Installing the model failed: {e}"
+        self._complete(job_id, error, vocab_size=len(result[0]) if error is None else None,
+                       classifier_fitted=error is None and result[2] is not None)
+
+    def _complete(self, job_id: str, error: Optional[str], **details):
+        with self._lock:
+            if self._status.get("job_id") != job_id or not self.running:
+                return
+            if error is None:
+                self._status.update(details)
+            self._finish("completed" if error is None else "failed", error)
+            status = self.status()
+        for listener in self.on_finish:
+            try:
+                listener(status)
+            except Exception as e:
+                print(f"⚠ Training finish listener failed: {e}")
+
+    def _finish(self, state: str, error: Optional[str] = None):
+        self._status.update(state=state, finished_at=time.time(), error=error)
+        if state == "completed":
+            self._status.update(phase="done", progress=1.0)
+        self._process = None
+        if self._job_lock is not None:
+            # After installing: workers waiting on the lock find the new embeddings in the store
+            unlock_file(self._job_lock)
+            self._job_lock.close()
+            self._job_lock = None
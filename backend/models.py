@@ -3,6 +3,7 @@ from pydantic import BaseModel
 
 class InteractionCheckRequest(BaseModel):
     drugs: List[str]
+    wait_for_audit: bool = False  # Block until the audit record is durable and return its receipt
 
 class InteractionResult(BaseModel):
     drugA: str
@@ -48,7 +49,42 @@ class PredictResponse(BaseModel):
     known_interaction: bool
     predicted_risk_score: float
     comment: str
+    model_status: str = "ready"  # "ready", "warming" (training in the background) or "untrained"
+    training_error: Optional[str] = None  # Why the last training job failed, while untrained
+
+class BatchPredictRequest(BaseModel):
+    drugs: List[str] = []  # A regimen: every pair of these drugs is scored
+    pairs: List[List[str]] = []  # Or explicit [drug_a, drug_b] pairs
+
+class PairPrediction(BaseModel):
+    drug_a: str
+    drug_b: str
+    known_interaction: bool
+    severity: Optional[str] = None  # Severity of a known interaction
+    predicted_risk_score: float
+    comment: str
+
+class BatchPredictResponse(BaseModel):
+    predictions: List[PairPrediction]
+    model_status: str = "ready"
+    model_version: Optional[str] = None
+    training_error: Optional[str] = None
+
+class NovelInteractionCandidate(BaseModel):
+    drug: str
+    predicted_risk_score: float
+
+class NovelInteractionsResponse(BaseModel):
+    drug: str
+    candidates: List[NovelInteractionCandidate]  # Most similar first; known interactions excluded
+    model_status: str = "ready"
+    model_version: Optional[str] = None
+    training_error: Optional[str] = None
 
 class AnalyticsResponse(BaseModel):
     top_risky_pairs: List[Dict[str, Any]]
     severity_distribution: Dict[str, int]
+    graph_stats: Dict[str, Any] = {}
+    degree_distribution: Dict[str, int] = {}
+    top_degree_drugs: List[Dict[str, Any]] = []
+    components: Dict[str, Any] = {}
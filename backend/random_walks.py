@@ -0,0 +1,120 @@
+"""
+Node2Vec random walks over CSR adjacency
+All walks of a batch advance together, one vectorized step at a time. The next drug is a uniform
+pick from the current drug's neighbor slice; when p or q is not 1, the pick is accepted or redrawn
+against the second-order bias (rejection sampling), so nothing is precomputed per (previous, current)
+pair. Rounds of walks are spread over worker processes, each writing a token file that Word2Vec
+reads in corpus_file mode.
+"""
+import multiprocessing as mp
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from .config import WALK_BATCH
+from .interaction_graph import find_edges
+
+
+def walk_batch(indptr: np.ndarray, indices: np.ndarray, starts: np.ndarray, length: int,
+               p: float = 1.0, q: float = 1.0, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    One walk of `length` drugs from each start, as an int32 (len(starts), length) matrix.
+    A drug without interactions cannot move; its row is -1 after the start.
+    """
+    rng = rng or np.random.default_rng()
+    walks = np.full((len(starts), length), -1, dtype=np.int32)
+    walks[:, 0] = starts
+    # Undirected: every drug reached by a step has a neighbor, so only isolated starts stop early
+    alive = np.flatnonzero(indptr[np.asarray(starts) + 1] > indptr[starts])
+    biased = p != 1 or q != 1
+    max_bias = max(1 / p, 1.0, 1 / q)
+
+    def pick(current: np.ndarray) -> np.ndarray:
+        lo = indptr[current]
+        return indices[lo + (rng.random(len(current)) * (indptr[current + 1] - lo)).astype(np.int64)]
+
+    for step in range(1, length):
+        if not len(alive):
+            break
+        current = walks[alive, step - 1]
+        nxt = pick(current)
+        if biased and step > 1:
+            previous = walks[alive, step - 2]
+            pending = np.arange(len(alive))
+            while len(pending):
+                x, t = nxt[pending], previous[pending]
+                bias = np.where(x == t, 1 / p, np.where(find_edges(indptr, indices, t, x) >= 0, 1.0, 1 / q))
+                pending = pending[rng.random(len(pending)) * max_bias >= bias]
+                nxt[pending] = pick(current[pending])
+        walks[alive, step] = nxt
+    return walks
+
+
+def _format_walks(walks: np.ndarray, tokens: np.ndarray) -> str:
+    """One line of space-separated node IDs per walk."""
+    full = walks[:, -1] >= 0
+    lines = list(map(" ".join, tokens[walks[full]].tolist()))
+    for row in walks[~full]:
+        lines.append(" ".join(tokens[row[row >= 0]].tolist()))
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _walk_task(args) -> int:
+    csr_dir, rounds, length, p, q, seed, out_path = args
+    indptr = np.load(Path(csr_dir) / "indptr.npy", mmap_mode="r")
+    indices = np.load(Path(csr_dir) / "indices.npy", mmap_mode="r")
+    sources = np.load(Path(csr_dir) / "starts.npy")
+    tokens = np.array([str(t) for t in np.load(Path(csr_dir) / "tokens.npy").tolist()], dtype=object)
+    rng = np.random.default_rng(seed)
+    # Each round starts one walk from every source in shuffled order; batches span rounds so that
+    # small graphs still advance WALK_BATCH walks per vectorized step
+    starts = np.concatenate([rng.permutation(sources) for _ in range(rounds)])
+    with open(out_path, 'w', encoding='ascii') as f:
+        for start in range(0, len(starts), WALK_BATCH):
+            f.write(_format_walks(walk_batch(indptr, indices, starts[start:start + WALK_BATCH], length, p, q, rng),
+                                  tokens))
+    return rounds
+
+
+def write_walk_corpus(indptr: np.ndarray, indices: np.ndarray, path: Path, num_walks: int, length: int,
+                      p: float = 1.0, q: float = 1.0, workers: int = 1, seed: Optional[int] = None,
+                      starts: Optional[np.ndarray] = None, tokens: Optional[np.ndarray] = None,
+                      progress: Optional[Callable[[float], None]] = None) -> Path:
+    """
+    Writes `num_walks` walks from every drug in `starts` (default: all) to `path`, one line per walk.
+    Each drug is written as its entry in `tokens` (default: its node ID).
+    Rounds run in `workers` processes that map the CSR arrays from disk instead of copying them.
+    """
+    progress = progress or (lambda fraction: None)
+    path = Path(path)
+    count = len(indptr) - 1
+    with tempfile.TemporaryDirectory(prefix="walks-", dir=path.parent) as tmp:
+        np.save(Path(tmp) / "indptr.npy", np.asarray(indptr, dtype=np.int64))
+        np.save(Path(tmp) / "indices.npy", np.asarray(indices, dtype=np.int32))
+        np.save(Path(tmp) / "starts.npy", np.arange(count, dtype=np.int32) if starts is None
+                else np.asarray(starts, dtype=np.int32))
+        np.save(Path(tmp) / "tokens.npy", np.arange(count, dtype=np.int64) if tokens is None
+                else np.asarray(tokens, dtype=np.int64))
+        chunks = [len(c) for c in np.array_split(np.arange(num_walks), min(num_walks, max(workers, 1) * 4)) if len(c)]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        tasks = [(tmp, rounds, length, p, q, s, str(Path(tmp) / f"walks-{k}.txt"))
+                 for k, (rounds, s) in enumerate(zip(chunks, seeds))]
+        done = 0
+        if workers > 1 and len(tasks) > 1:
+            # Spawned, not forked: the caller may be a threaded server process
+            with mp.get_context("spawn").Pool(min(workers, len(tasks))) as pool:
+                for rounds in pool.imap_unordered(_walk_task, tasks):
+                    done += rounds
+                    progress(done / num_walks)
+        else:
+            for task in tasks:
+                done += _walk_task(task)
+                progress(done / num_walks)
+        with open(path, 'wb') as out:
+            for task in tasks:
+                with open(task[-1], 'rb') as shard:
+                    shutil.copyfileobj(shard, out)
+    return path
@@ -2,8 +2,9 @@ import axios from 'axios';
 
 const API_URL = 'https://pharmnexus.onrender.com/api';
 
-export const checkInteractions = async (drugs: string[]) => {
-    const response = await axios.post(`${API_URL}/check_interactions`, { drugs });
+// waitForAudit: resolve only once the audit record is on disk (the response carries its receipt)
+export const checkInteractions = async (drugs: string[], waitForAudit = false) => {
+    const response = await axios.post(`${API_URL}/check_interactions`, { drugs, wait_for_audit: waitForAudit });
     return response.data;
 };
 
@@ -8,33 +8,48 @@ interface BlockchainExplorerProps {
     refreshTrigger?: number;
 }
 
+const PAGE_SIZE = 50;
+
 export default function BlockchainExplorer({ refreshTrigger = 0 }: BlockchainExplorerProps) {
     const [chain, setChain] = useState<any[]>([]);
+    const [nextCursor, setNextCursor] = useState<number | null>(null);
 
     useEffect(() => {
         fetchChain();
     }, [refreshTrigger]);
 
+    // Newest blocks first, one bounded page at a time
+    const fetchPage = async (cursor: number | null) => {
+        const params: Record<string, string | number> = { limit: PAGE_SIZE, order: 'desc' };
+        if (cursor !== null) params.cursor = cursor;
+        const response = await axios.get(`${API_URL}/audit/chain`, { params });
+        setNextCursor(response.data.next_cursor);
+        return response.data.blocks;
+    };
+
     const fetchChain = async () => {
         try {
-            // In a real app we'd have a specific endpoint, but we can read the file or add an endpoint.
-            // For now, let's assume we can get it via analytics or just mock the visualization if the endpoint is missing.
-            // Wait, we didn't add a specific "get_chain" endpoint. Let's add one quickly or use analytics data if it includes it.
-            // Actually, let's just mock the read for the demo UI if we can't easily add the endpoint now without restarting backend.
-            // BUT, we can add the endpoint to main.py easily.
-
-            // Let's try to fetch from a new endpoint we'll create, or fall back to empty.
-            const response = await axios.get(`${API_URL}/audit/chain`);
-            setChain(response.data);
+            setChain(await fetchPage(null));
         } catch (e) {
             console.log("Chain endpoint not found, using mock data for UI demo");
+            setNextCursor(null);
             setChain([
-                { index: 0, timestamp: Date.now() / 1000 - 1000, hash: "000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f", data: { message: "Genesis Block" } },
-                { index: 1, timestamp: Date.now() / 1000 - 500, hash: "00000000839a8e6886ab5951d76f411475428afc90947ee320161bbf18eb6048", prev_hash: "...", data: { drugs: ["Warfarin", "Aspirin"], global_risk: "High" } }
+                { index: 1, timestamp: Date.now() / 1000 - 500, hash: "00000000839a8e6886ab5951d76f411475428afc90947ee320161bbf18eb6048", prev_hash: "...", data: { drugs: ["Warfarin", "Aspirin"], global_risk: "High" } },
+                { index: 0, timestamp: Date.now() / 1000 - 1000, hash: "000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f", data: { message: "Genesis Block" } }
             ]);
         }
     };
 
+    const loadOlder = async () => {
+        if (nextCursor === null) return;
+        try {
+            const older = await fetchPage(nextCursor);
+            setChain(prev => [...prev, ...older]);
+        } catch (e) {
+            console.log("Failed to load older blocks", e);
+        }
+    };
+
     return (
         <div className="bg-slate-900/90 border border-slate-700 rounded-xl p-4 h-full overflow-hidden flex flex-col">
             <div className="flex items-center justify-between mb-4">
@@ -48,7 +63,7 @@ export default function BlockchainExplorer({ refreshTrigger = 0 }: BlockchainExp
 
             <div className="flex-1 overflow-y-auto space-y-4 custom-scrollbar pr-2">
                 {chain.map((block, i) => (
-                    <div key={i} className="relative pl-6 pb-6 border-l-2 border-slate-700 last:border-0 last:pb-0">
+                    <div key={block.index ?? i} className="relative pl-6 pb-6 border-l-2 border-slate-700 last:border-0 last:pb-0">
                         <div className="absolute -left-[9px] top-0 w-4 h-4 rounded-full bg-slate-800 border-2 border-teal-500 flex items-center justify-center">
                             <div className="w-1.5 h-1.5 bg-teal-400 rounded-full animate-pulse"></div>
                         </div>
@@ -71,6 +86,15 @@ export default function BlockchainExplorer({ refreshTrigger = 0 }: BlockchainExp
                         </div>
                     </div>
                 ))}
+
+                {nextCursor !== null && (
+                    <button
+                        onClick={loadOlder}
+                        className="w-full text-xs text-teal-400 border border-slate-700 rounded-lg py-2 hover:border-teal-500/50 transition-colors"
+                    >
+                        LOAD OLDER BLOCKS
+                    </button>
+                )}
             </div>
         </div>
     );
@@ -39,7 +39,8 @@ export default function Dashboard() {
         setLoading(true);
         setError(null);
         try {
-            const result = await checkInteractions(drugs);
+            // Wait for the audit write so the refreshed log already shows this check
+            const result = await checkInteractions(drugs, true);
             setAnalysis(result);
             setAuditRefreshTrigger(prev => prev + 1); // Trigger audit log refresh
         } catch (e) {
@@ -62,7 +63,7 @@ export default function Dashboard() {
                 // But since we updated state, the user can just click "Run Analysis" or we can use a useEffect
                 // For now, let's just add them and let the user click run, or trigger it via a separate effect if needed.
                 // Actually, let's trigger it manually with the new list
-                checkInteractions([...drugs, ...newDrugs]).then(result => {
+                checkInteractions([...drugs, ...newDrugs], true).then(result => {
                     setAnalysis(result);
                     setAuditRefreshTrigger(prev => prev + 1);
                 });